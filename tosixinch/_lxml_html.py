@@ -1,8 +1,11 @@
 
 """Add a few utilities to lxml.html."""
 
+import collections
 import logging
+import os
 import re
+import threading
 
 from tosixinch import system
 
@@ -106,23 +109,141 @@ class HTMLParser(etree.HTMLParser):
         self.set_element_class_lookup(HtmlElementClassLookup())
 
 
+# Parsers are not thread-safe, so keep one parser per thread, and reuse it.
+_local = threading.local()
+
+
+def _get_parser():
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = HTMLParser()
+    return parser
+
+
 # Wrap the functions to use this module's HTMLParser.
 # Use keyword arguments except for first 'html' argument.
 
 def document_fromstring(html, **kw):
-    return lxml.html.document_fromstring(html, parser=HTMLParser(), **kw)
+    return lxml.html.document_fromstring(html, parser=_get_parser(), **kw)
 
 
 def fragments_fromstring(html, **kw):
-    return lxml.html.fragments_fromstring(html, parser=HTMLParser(), **kw)
+    return lxml.html.fragments_fromstring(html, parser=_get_parser(), **kw)
 
 
 def fragment_fromstring(html, **kw):
-    return lxml.html.fragment_fromstring(html, parser=HTMLParser(), **kw)
+    return lxml.html.fragment_fromstring(html, parser=_get_parser(), **kw)
 
 
 def fromstring(html, **kw):
-    return lxml.html.fromstring(html, parser=HTMLParser(), **kw)
+    return lxml.html.fromstring(html, parser=_get_parser(), **kw)
+
+
+def make_elements(tag, attribs):
+    """Build elements of the same tag, without parsing html strings.
+
+    attribs: attribute dicts (in the order of serialization)
+    """
+    makeelement = _get_parser().makeelement
+    return [makeelement(tag, attrib) for attrib in attribs]
+
+
+# document cache
+
+DOC_CACHE_SIZE = 64 * 1024 * 1024  # bytes (estimated memory)
+DOC_SIZE_FACTOR = 8  # a parsed document is about 8 times the file size
+
+
+class DocumentCache(object):
+    """Keep parsed html files in memory, in a run.
+
+    Efiles are read many times in a convert run
+    (in dedup, incremental and volume checks, and in merging).
+    An entry is keyed by the file path and decoding arguments,
+    and validated by the file's mtime and size.
+
+    The documents are shared, not copied,
+    so callers must not modify them
+    (or ``pop`` them from the cache, to own them).
+
+    The memory of an entry is estimated from the file size.
+    When the sum exceeds ``maxsize``,
+    least recently used entries are discarded.
+    """
+
+    def __init__(self, maxsize=DOC_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _stat(self, fname):
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stat, size, doc, encoding = entry
+        if stat != self._stat(key[0]):
+            self._discard(key)
+            return None
+        return entry
+
+    def get(self, fname, decoding=None):
+        """Return document and encoding, or None."""
+        key = fname, decoding
+        entry = self._get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[2:]
+
+    def pop(self, fname, decoding=None):
+        """Return document and encoding removing the entry, or None."""
+        key = fname, decoding
+        entry = self._get(key)
+        if entry is None:
+            return None
+        self._discard(key)
+        return entry[2:]
+
+    def set(self, fname, doc, decoding=None, encoding='utf-8'):
+        key = fname, decoding
+        self._discard(key)
+        stat = self._stat(fname)
+        if stat is None:
+            return
+        size = stat[1] * DOC_SIZE_FACTOR
+        if size > self.maxsize:
+            return
+        self._entries[key] = stat, size, doc, encoding
+        self._size += size
+        while self._size > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._size -= entry[1]
+
+    def discard(self, fname):
+        """Remove all entries of the file."""
+        for key in [key for key in self._entries if key[0] == fname]:
+            self._discard(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+
+doc_cache = DocumentCache()
 
 
 # read and write utility functions
@@ -131,14 +252,43 @@ class HtmlReader(system.Reader):
     """html reader object.
 
     From file or text, return document object (lxml_html.HtmlElement).
+
+    ``cache`` is one of:
+
+    None:    don't use ``doc_cache``
+    'share': return a cached document (callers must not modify it)
+    'pop':   return a cached document, removing it from the cache
     """
 
+    def __init__(self, fname, text=None, codings=None,
+            errors='strict', length=None, cache=None):
+        super().__init__(fname, text, codings, errors, length)
+        self.cache = cache
+
     def _parse(self):
         self.doc = document_fromstring(self.text.encode('utf-8'))
 
     def read(self):
+        if self.text or self.cache is None:
+            self._prepare()
+            self._parse()
+            return self.doc
+
+        fname = self.get_filename(self.fname)
+        decoding = tuple(self.codings or ()), self.errors
+        if self.cache == 'pop':
+            entry = doc_cache.pop(fname, decoding)
+        else:
+            entry = doc_cache.get(fname, decoding)
+        if entry is not None:
+            self.doc, self.encoding = entry
+            return self.doc
+
         self._prepare()
         self._parse()
+        if self.cache == 'share':
+            doc_cache.set(fname, self.doc,
+                decoding=decoding, encoding=self.encoding)
         return self.doc
 
 
@@ -163,10 +313,36 @@ class HtmlWriter(system.Writer):
         self._serialize()
         super()._prepare(fname)
 
+    def write(self, fname=None):
+        fname = fname or self.fname
+        super().write(fname)
+        doc_cache.discard(self.get_filename(fname))
+
+
+class HtmlStreamWriter(system.Writer):
+    """html writer object, to write serialized text part by part.
 
-def read(fname, text=None, codings=None, errors='strict'):
-    return HtmlReader(fname, text, codings, errors).read()
+    ``text`` is an iterable of strings.
+    """
+
+    def _write(self, fname):
+        with open(fname, 'w') as f:
+            for text in self.text:
+                f.write(text)
+
+    def write(self, fname=None):
+        fname = fname or self.fname
+        super().write(fname)
+        doc_cache.discard(self.get_filename(fname))
+
+
+def read(fname, text=None, codings=None, errors='strict', cache=None):
+    return HtmlReader(fname, text, codings, errors, cache=cache).read()
 
 
 def write(fname, doc=None, text=None):
     return HtmlWriter(fname, doc, text).write()
+
+
+def write_stream(fname, texts):
+    return HtmlStreamWriter(fname, texts).write()
@@ -1,12 +1,15 @@
 
 """Provide abstract action processes and classes."""
 
+import html
 import logging
 import os
 import random
+import threading
 import time
 
 from tosixinch import cached_property
+from tosixinch import instrument
 from tosixinch import location
 from tosixinch import lxml_html
 from tosixinch import stylesheet
@@ -14,6 +17,10 @@ from tosixinch import system
 
 logger = logging.getLogger(__name__)
 
+# guard ``conf._cache.download``,
+# shared by download and extract threads (``pipeline`` option)
+_DOWNLOAD_LOCK = threading.Lock()
+
 
 class _File(system._File):
     """Manage dfile and efile translation."""
@@ -102,14 +109,15 @@ class Downloader(Action):
         force = self._site.general.force_download
         cache = self._conf._cache.download
 
-        if os.path.isfile(self.get_filename(dfile)):
-            if not force:
-                return True
-            else:
-                if cache.get(dfile):
+        with _DOWNLOAD_LOCK:
+            if os.path.isfile(self.get_filename(dfile)):
+                if not force:
                     return True
+                else:
+                    if cache.get(dfile):
+                        return True
 
-        cache[dfile] = 1
+            cache[dfile] = 1
         return False
 
     def request(self, site, on_error_exit=True):
@@ -123,8 +131,12 @@ class Downloader(Action):
             timeout=timeout, on_error_exit=on_error_exit)
 
     def process(self):
-        for p in self._site.general.dprocess:
-            system.run_function(self._conf._userdir, 'dprocess', self.agent, p)
+        userdir = self._conf._userdir
+        dprocess = self._site.general.dprocess
+        section = self._site.section
+        for func in system.get_functions(userdir, 'dprocess', dprocess):
+            with instrument.record(section, 'dprocess:%s' % func.name):
+                func(self.agent)
 
     def retrieve(self, on_error_exit=True):
         self.text = system.retrieve(self.agent, on_error_exit=on_error_exit)
@@ -175,7 +187,7 @@ class CompDownloader(Downloader):
 class TextFormatter(Action):
     """Provide common extraction methods for html and non-html."""
 
-    CSS_REF = '<link class="tsi-css" href="%s" rel="stylesheet">'
+    CSS_ATTRIB = {'class': 'tsi-css', 'href': None, 'rel': 'stylesheet'}
 
     @property
     def text(self):
@@ -193,9 +205,15 @@ class TextFormatter(Action):
             sheets.append(url)
         return sheets
 
-    def get_css_reference(self):
+    def get_css_attribs(self):
         for sheet in self.stylesheets:
-            yield self.CSS_REF % sheet
+            yield {**self.CSS_ATTRIB, 'href': sheet}
+
+    def get_css_reference(self):
+        for attrib in self.get_css_attribs():
+            attrs = ' '.join('%s="%s"' % (k, html.escape(v))
+                for k, v in attrib.items())
+            yield '<link %s>' % attrs
 
     def write(self, efile, text):
         if self._site.is_remote:
@@ -210,9 +228,8 @@ class Extractor(TextFormatter):
         return self._parse(self.dfile, text=self.text)
 
     def _add_css_elememnt(self, doc):
-        for htmlstr in self.get_css_reference():
-            el = lxml_html.fragment_fromstring(htmlstr)
-            doc.head.append(el)
+        attribs = self.get_css_attribs()
+        doc.head.extend(lxml_html.make_elements('link', attribs))
 
     def add_css_elememnt(self):
         self._add_css_elememnt(self.doc)
@@ -31,6 +31,7 @@ import re
 from tosixinch import lxml_html  # use lxml_html_clean from lxml_html
 
 RE_CSS_DECLARATION = re.compile(r'^\s*([\w-]+)\s*:\s*(.*?)\s*$')
+RE_CSS_PROPERTY = re.compile(r'[\w-]+')
 RE_CSS_VALUE = re.compile(r"""((?:"[^"]+")|(?:'[^\']+')|(?:[^ \t\n]+))""")
 
 KEEP_STYLE = 'tsi-keep-style'
@@ -90,7 +91,7 @@ class Clean(object):
         self.tags = tags
         self.attrs = attrs
         self.paths = paths
-        self.stylematcher = StyleMatcher(styles)
+        self.stylematcher = get_stylematcher(styles)
 
     def _clean_html(self):
         if self.tags:
@@ -148,21 +149,29 @@ class StyleMatcher(object):
     # '(' is used e.g. in function calls
     DIFFICULT_PARSE_INDICATOR = ',/('
 
+    # max number of memoized style strings (cleared when full)
+    MEMO_SIZE = 4096
+
     def __init__(self, matches=None):
         if not matches:
             matches = []
         self.matches, self.raw_props = self.build_matches(matches)
+        self._memo = {}
 
     def parse_declaration(self, declarations):
+        # The same as matching each one with ``RE_CSS_DECLARATION``,
+        # but without regex backtracking.
         for dec in declarations.split(';'):
-            if not dec.strip():
+            prop, sep, valstr = dec.partition(':')
+            if not sep:
+                continue
+            prop = prop.strip()
+            valstr = valstr.strip()
+            if '\n' in valstr or not RE_CSS_PROPERTY.fullmatch(prop):
                 continue
-            m = RE_CSS_DECLARATION.match(dec)
-            if m:
-                prop, valstr = m.groups()
-                prop = prop.lower()
-                valstr = valstr.replace(' !important', '').strip()
-                yield prop, valstr
+            prop = prop.lower()
+            valstr = valstr.replace(' !important', '').strip()
+            yield prop, valstr
 
     def parse_values(self, valstr):
         for c in self.DIFFICULT_PARSE_INDICATOR:
@@ -189,6 +198,14 @@ class StyleMatcher(object):
 
     def run_matches(self, cssstr):
         """Return a new css string containg only the matched ones."""
+        css = self._memo.get(cssstr)
+        if css is None:
+            if len(self._memo) >= self.MEMO_SIZE:
+                self._memo.clear()
+            css = self._memo[cssstr] = self._run_matches(cssstr)
+        return css
+
+    def _run_matches(self, cssstr):
         csslist = []
         for prop, valstr in self.parse_declaration(cssstr):
             if prop in self.raw_props:
@@ -211,3 +228,14 @@ class StyleMatcher(object):
             s[prop] = '%s: %s' % (prop, values)
 
         return '; '.join(s.values())
+
+
+_stylematchers = {}
+
+
+def get_stylematcher(matches=None):
+    """Return ``StyleMatcher``, reusing the one with the same matches."""
+    key = tuple(matches or ())
+    if key not in _stylematchers:
+        _stylematchers[key] = StyleMatcher(matches)
+    return _stylematchers[key]
@@ -1,9 +1,12 @@
 
 """Module for html content nmanipulations."""
 
+import base64
+import binascii
 import logging
 import posixpath
 import re
+import urllib.parse
 import zlib
 
 from tosixinch import location
@@ -12,11 +15,11 @@ from tosixinch import imagesize
 
 from tosixinch.urlmap import _split_fragment, _add_fragment
 
-import tosixinch.process.sample as process_sample
-
 logger = logging.getLogger(__name__)
 
 ABS_URL_RE = re.compile('^https?://', flags=re.IGNORECASE)
+DATA_URL_RE = re.compile(
+    r'^data:([^,]*?)(;base64)?,(.*)$', flags=re.IGNORECASE | re.DOTALL)
 
 HTML_TEMPLATE = """{doctype}
 <html>
@@ -52,15 +55,22 @@ def build_new_html(doctype=None, title=None, content=None):
     return root
 
 
-def get_component_size(el, dfile, stream=None):
+def _get_attribute_size(el):
     # Get size from html attributes (if any and the unit is no unit or 'px').
     w = el.get('width')
     h = el.get('height')
     if w and h:
-        match = re.match('^([0-9.]+)(?:px)?$', w)
-        w = int(match[1]) if match else None
-        match = re.match('^([0-9.]+)(?:px)?$', h)
-        h = int(match[1]) if match else None
+        match = re.match('^([0-9]+(?:[.][0-9]*)?)(?:px)?$', w)
+        w = int(float(match[1])) if match else None
+        match = re.match('^([0-9]+(?:[.][0-9]*)?)(?:px)?$', h)
+        h = int(float(match[1])) if match else None
+    if w and h:
+        return w, h
+    return None, None
+
+
+def get_component_size(el, dfile, stream=None):
+    w, h = _get_attribute_size(el)
     if w and h:
         return w, h
 
@@ -76,6 +86,49 @@ def get_component_size(el, dfile, stream=None):
         return None, None
 
 
+def get_component_sizes(components):
+    """Get sizes from a list of element and dfile pairs.
+
+    The same as ``get_component_size``,
+    but probe files in a batch (each file only once).
+    """
+    sizes = [_get_attribute_size(el) for el, dfile in components]
+    dfiles = [dfile for (el, dfile), (w, h) in zip(components, sizes)
+        if not (w and h)]
+    file_sizes = imagesize.get_sizes(dfiles)
+    for i, (el, dfile) in enumerate(components):
+        if sizes[i] == (None, None) and file_sizes.get(dfile):
+            mime, w, h = file_sizes[dfile]
+            sizes[i] = int(w), int(h)
+    return sizes
+
+
+def is_data_url(url):
+    return url.lstrip()[:5].lower() == 'data:'
+
+
+def decode_data_url(url):
+    """Return mime type and decoded bytes from 'data:' URL.
+
+    Return ``(None, None)`` if it is not a valid 'data:' URL.
+    """
+    match = DATA_URL_RE.match(url.strip())
+    if not match:
+        return None, None
+    mime, is_base64, data = match.groups()
+    mime = mime.split(';')[0].strip().lower() or 'text/plain'
+    if is_base64:
+        data = re.sub(r'\s+', '', urllib.parse.unquote(data))
+        data += '=' * (-len(data) % 4)  # some omit padding
+        try:
+            data = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            return None, None
+    else:
+        data = urllib.parse.unquote_to_bytes(data)
+    return mime, data
+
+
 def is_abs_url(path):
     if ABS_URL_RE.match(path):
         return True
@@ -104,6 +157,20 @@ def cur2rel(basepath, path):
     return po.normpath(po.relpath(path, start=po.dirname(basepath)))
 
 
+def iter_local_components(doc, fname):
+    """Yield tag and path (against current directory) of local components.
+
+    fname: the html file name of the doc
+    """
+    for tag, attr in COMP_ATTRS:
+        for el in doc.iter(tag):
+            ref = el.get(attr)
+            if not ref or is_abs_url(ref) or is_data_url(ref):
+                continue
+            path = urllib.parse.unquote(ref.split('#')[0])
+            yield tag, rel2cur(fname, path)
+
+
 class Resolver(object):
     """Rewrite relative references in html doc."""
 
@@ -144,6 +211,9 @@ class Resolver(object):
     def get_component(self, el):
         for tag, attr in COMP_ATTRS:
             if el.tag == tag and attr in el.attrib:
+                if is_data_url(el.attrib[attr]):
+                    self._get_data_component(el, attr)
+                    continue
                 comp, url, fragment = self._get_url_data(el, attr)
                 self._get_component(el, comp)
                 self._set_component(comp)
@@ -151,12 +221,17 @@ class Resolver(object):
     def _get_component(self, el, comp):
         pass
 
+    def _get_data_component(self, el, attr):
+        pass
+
     def _set_component(self, comp):
         self.sibling_urls[comp.url] = comp.relative_reference
 
     def _resolve(self, el):
         for attr in LINK_ATTRS:
             if attr in el.attrib:
+                if is_data_url(el.attrib[attr]):
+                    continue
                 comp, url, fragment = self._get_url_data(el, attr)
                 url = comp.url
                 if url in self.sibling_urls:
@@ -167,7 +242,14 @@ class Resolver(object):
 
 
 class Merger(object):
-    """Merge htmls (toc, and weasyprint)."""
+    """Merge htmls (toc, and weasyprint).
+
+    Child htmls are read twice, not to keep all of them in memory.
+    First, to collect ids (for ``hashid``) and css references,
+    second, to rewrite and write them out one by one.
+    """
+
+    PLACEHOLDER = 'tsi-merged-bodies'
 
     def __init__(self, doc, root, children, table=None,
             hashid=False, codings=None, errors='strict'):
@@ -180,7 +262,8 @@ class Merger(object):
         self.errors = errors
 
         self._h1 = self.check_heading()
-        self._css_cache = []
+        self._css_cache = set()
+        self._component_cache = {}  # {(child, url): new url}
 
     def check_heading(self):
         if self.doc.xpath('//h1'):
@@ -191,60 +274,75 @@ class Merger(object):
         for el in doc.iter(lxml_html.etree.Element):
             yield el
 
+    def _read(self, child, cache=None):
+        return lxml_html.read(child, codings=self.codings,
+            errors=self.errors, cache=cache)
+
     def merge(self):
         self.table.id_cache = {}  # intialization
-        codings, errors = self.codings, self.errors
-        docs = []
         for child in self.children:
-            doc = lxml_html.read(child, codings=codings, errors=errors)
-            for el in self.iterate_doc(doc):
-                self.relink_id_ref(child, el)
-            docs.append(doc)
-
-        for child, doc in zip(self.children, docs):
+            # Take the document if already parsed (e.g. in dedup).
+            doc = self._read(child, cache='pop')
+            if self.hashid:
+                for el in self.iterate_doc(doc):
+                    self.relink_id_ref(child, el)  # filling id_cache
             self.append_css(child, doc)
-            self.append_body(child, doc)
 
         self.write()
 
+    def _iter_bodies(self):
+        for child in self.children:
+            doc = self._read(child)
+            for b in self.rewrite_body(child, doc):
+                yield lxml_html.tostring(b, encoding='unicode')
+
     def append_css(self, child, doc):
         for el in doc.xpath('//head/link[@rel="stylesheet"]'):
+            self.relink_id_ref(child, el)
             href = el.get('href') or ''
             if href:
                 href = rel2cur(child, href)
                 if href not in self._css_cache:
-                    self._css_cache.append(href)
+                    self._css_cache.add(href)
 
                     href = cur2rel(self.root, href)
                     el.set('href', href)
                     self.doc.head.append(el)
 
-    def append_body(self, child, doc):
-        for b in doc.xpath('//body'):
+    def rewrite_body(self, child, doc):
+        """Rewrite bodies to divs to merge, and return them."""
+        if self._h1:
+            import tosixinch.process.sample as process_sample
+        bodies = doc.xpath('//body')
+        for b in bodies:
             if self._h1:
                 process_sample.lower_heading(b)
             for el in self.iterate_doc(b):
+                self.relink_id_ref(child, el)
                 self.relink_component(el, self.root, child)
                 self.relink_id(child, el)
             b.tag = 'div'
             b.set('id', self.table.path2id(child))
             b.set('class', 'tsi-body-merged')
-            self.doc.body.append(b)
+        return bodies
 
     def relink_component(self, el, root, child):
         for tag, attr in COMP_ATTRS:
             if el.tag == tag and attr in el.attrib:
                 url = el.attrib[attr].strip()
-                url = rel2cur(child, url)
-                url = cur2rel(root, url)
-                el.attrib[attr] = url
+                key = child, root, url
+                if key not in self._component_cache:
+                    new = cur2rel(root, rel2cur(child, url))
+                    self._component_cache[key] = new
+                el.attrib[attr] = self._component_cache[key]
 
     def relink_id_ref(self, child, el):
-        for attr in LINK_ATTRS:
-            if attr in el.attrib:
-                url = el.attrib[attr].strip()
+        attrib = el.attrib
+        for attr in attrib.keys():
+            if attr in LINK_ATTRS:
+                url = attrib[attr].strip()
                 new = self.table.get(child, url)  # filling id_cache
-                el.attrib[attr] = new
+                attrib[attr] = new
 
     def relink_id(self, child, el):
         if not self.table.id_cache:
@@ -254,10 +352,26 @@ class Merger(object):
             return
         new = self.table.id_cache.get((child, id_.strip()))
         if new:
-            el['id'] = new
+            el.set('id', new)
 
     def write(self):
-        lxml_html.write(self.root, doc=self.doc)
+        # Serialize the root document with a placeholder,
+        # and write child bodies in place of it.
+        placeholder = lxml_html.etree.Comment(self.PLACEHOLDER)
+        self.doc.body.append(placeholder)
+        try:
+            tree = self.doc.getroottree()
+            text = lxml_html.tostring(tree, encoding='unicode')
+        finally:
+            self.doc.body.remove(placeholder)
+        head, tail = text.split('<!--%s-->' % self.PLACEHOLDER)
+
+        def texts():
+            yield head
+            yield from self._iter_bodies()
+            yield tail
+
+        lxml_html.write_stream(self.root, texts())
 
 
 class IDTable(object):
@@ -272,6 +386,11 @@ class IDTable(object):
         self.hashid = hashid
         self.id_cache = {}
 
+        # The same (child, url) pairs are repeated many times.
+        self._memo = {}  # {(child, url): (new url, id_cache item or None)}
+        self._ids = {}  # {path: id}
+        self._checksums = {}  # {path: checksum}
+
     def create_dict(self, table):
         t = {}
         if table is None:
@@ -284,6 +403,23 @@ class IDTable(object):
         return t
 
     def get(self, child, url):
+        key = child, url
+        if key not in self._memo:
+            id_cache = self.id_cache
+            self.id_cache = {}
+            try:
+                new = self._get(child, url)
+                item = next(iter(self.id_cache.items()), None)
+            finally:
+                self.id_cache = id_cache
+            self._memo[key] = new, item
+
+        new, item = self._memo[key]
+        if item:
+            self.id_cache[item[0]] = item[1]
+        return new
+
+    def _get(self, child, url):
         src, fragment = _split_fragment(url)
         if src == '':
             src = child
@@ -309,11 +445,15 @@ class IDTable(object):
         return _add_fragment(dest, new)
 
     def path2id(self, path):
-        return location.slugify(path.split('/')[-1])
+        if path not in self._ids:
+            self._ids[path] = location.slugify(path.split('/')[-1])
+        return self._ids[path]
 
     def get_checksum(self, url):
-        data = url.encode('utf-8')
-        return '%08x' % (zlib.crc32(data) & 0xffffffff)
+        if url not in self._checksums:
+            data = url.encode('utf-8')
+            self._checksums[url] = '%08x' % (zlib.crc32(data) & 0xffffffff)
+        return self._checksums[url]
 
     def format_hash_frag(self, src, fragment, hash_):
         return '%s-%s' % (fragment, hash_)
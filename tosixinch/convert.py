@@ -2,19 +2,29 @@
 """Build commandline strings and run conversion applications in shell."""
 
 import collections.abc
+import concurrent.futures
+import copy
+import hashlib
 import logging
 import os
 import shlex
 import subprocess
+import time
 
 from tosixinch import content
 from tosixinch import location
+from tosixinch import lxml_html
 from tosixinch import stylesheet
 from tosixinch import system
 from tosixinch import toc
 
 logger = logging.getLogger(__name__)
 
+FRAGMENT_DIR = '_pdf'
+MANIFEST = '_convert.json'
+
+_versions = {}  # {converter command: version string}
+
 
 def _extend(obj, args):
     """.append or .extend wisely, according to args type."""
@@ -41,23 +51,107 @@ def _is_newer(rfile, tocfile):
     return False
 
 
-def merge_htmls(paths, pdfname, hashid=False, codings=None, errors='strict'):
+def _get_rootname(pdfname):
+    if pdfname.lower().endswith('.pdf'):
+        return pdfname[:-4]
+    return pdfname
+
+
+def get_merged_name(paths, pdfname):
+    """Return the html file name ``merge_htmls`` makes (or uses)."""
     if len(paths) == 1:
         return paths[0]
+    return _get_rootname(pdfname) + '.html'
 
-    if pdfname.lower().endswith('.pdf'):
-        rootname = pdfname[:-4]
-    else:
-        rootname = pdfname
-    root = content.build_new_html(title=rootname)
 
-    hname = rootname + '.html'
-    table = ((hname, paths),)
+def merge_htmls(paths, pdfname, hashid=False, codings=None, errors='strict',
+        table=None):
+    """Merge htmls to one html, for pdfname.
+
+    table: tuple of (merged html, htmls) of all merged htmls,
+    to rewrite links to the other merged htmls (default: only this one)
+    """
+    hname = get_merged_name(paths, pdfname)
+    if len(paths) == 1:
+        return hname
+
+    root = content.build_new_html(title=_get_rootname(pdfname))
+    table = table or ((hname, paths),)
     content.Merger(
         root, hname, paths, table, hashid, codings, errors).merge()
     return hname
 
 
+def split_files(files, num):
+    """Split files to contiguous groups, of roughly the same total size."""
+    num = max(min(num, len(files)), 1)
+    sizes = [os.path.getsize(fname) for fname in files]
+    total = sum(sizes)
+
+    groups = [[]]
+    subtotal = 0
+    for i, (fname, size) in enumerate(zip(files, sizes)):
+        rest = len(files) - i  # files not grouped yet, including this one
+        if groups[-1] and len(groups) < num and (
+                subtotal >= total * len(groups) / num
+                or rest <= num - len(groups)):
+            groups.append([])
+        groups[-1].append(fname)
+        subtotal += size
+    return groups
+
+
+def _get_version(cmd):
+    if cmd not in _versions:
+        try:
+            ret = subprocess.run(cmd, capture_output=True, text=True)
+            _versions[cmd] = ret.stdout.strip()
+        except OSError:
+            _versions[cmd] = ''
+    return _versions[cmd]
+
+
+def _hash_file(fname, h):
+    try:
+        with open(fname, 'rb') as f:
+            h.update(f.read())
+    except OSError:
+        h.update(b'\0missing')
+
+
+def get_fragment_key(fname, settings, codings=None):
+    """Return a checksum to identify the PDF converted from a html.
+
+    It is built from the html, css contents, image file stats,
+    and settings (a list of strings, e.g. converter version and options).
+    """
+    h = hashlib.sha1()
+    for setting in settings:
+        h.update(setting.encode('utf-8') + b'\0')
+    _hash_file(fname, h)
+
+    doc = lxml_html.read(fname, codings=codings, cache='share')
+    for tag, path in content.iter_local_components(doc, fname):
+        h.update(b'\0' + path.encode('utf-8') + b'\0')
+        if tag == 'link':  # css may be rendered anew with the same content
+            _hash_file(path, h)
+            continue
+        try:
+            stat = os.stat(path)
+            h.update(b'%d:%d' % (stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            h.update(b'missing')
+    return h.hexdigest()
+
+
+def _weasyprint_render(hname, pdfname, stylesheets):
+    # Top level function, to be called in a worker process.
+    import weasyprint
+    weasyprint.HTML(filename=hname).write_pdf(
+        pdfname, stylesheets=stylesheets)
+    return pdfname
+
+
 class Convert(system._File):
     """Base class for each application specific classes."""
 
@@ -68,16 +162,28 @@ class Convert(system._File):
         self.pdfname = conf.pdfname
         self.style = conf.style
         self._encoding = conf.general.encoding
+        self.workers = conf.general.workers
+        self._table = None  # for merge_htmls, when converting volumes
 
         rfile = conf._rfile
         tocfile = self._get_tocfile(rfile)
+        self._toc_done = False  # files are toc htmls (chapters)
         if conf.general.raw:
             files = [site.rsrc for site in conf.sites]
         elif rfile and tocfile and _is_newer(rfile, tocfile):
+            self._toc_done = True
             locations = location.Locations(rfile=tocfile)
+            if conf.general.dedup:
+                from tosixinch import dedup
+                skip = dedup.Deduplicator().get_duplicates(conf.sites)
+                locations = [loc for loc in locations if loc.rsrc not in skip]
             files = [self.get_filename(loc.efile) for loc in locations]
         else:
-            files = [self.get_filename(site.efile) for site in conf.sites]
+            sites = conf.sites
+            if conf.general.dedup:
+                from tosixinch import dedup
+                sites = dedup.Deduplicator().filter(sites)
+            files = [self.get_filename(site.efile) for site in sites]
         self.files = files
 
         self.cmd = [self.path]
@@ -110,8 +216,8 @@ class Convert(system._File):
         _extend(self.cmd, self.files)
 
     def _add_merged_files(self):
-        self.hname = merge_htmls(
-            self.files, self.pdfname, codings=self._encoding)
+        self.hname = merge_htmls(self.files, self.pdfname,
+            codings=self._encoding, table=self._table)
         _extend(self.cmd, self.hname)
 
     def _add_pdfname(self, pdf_optstr=None):
@@ -134,6 +240,165 @@ class Convert(system._File):
     def run(self):
         raise NotImplementedError
 
+    def get_version(self):
+        return _get_version((self.path, '--version'))
+
+    def _get_settings(self):
+        # strings to identify conversion, other than html and its components
+        settings = [self.__class__.__name__, self.get_version()]
+        settings.append(' '.join(self.arguments or []))
+        for css in stylesheet.StyleSheet(self._conf).stylesheets2:
+            h = hashlib.sha1()
+            _hash_file(css, h)
+            settings.append(h.hexdigest())
+        return settings
+
+    def get_key(self):
+        """Return a checksum of all inputs of conversion.
+
+        Return ``None`` if some inputs are not local files.
+        """
+        if not all(os.path.isfile(fname) for fname in self.files):
+            return None
+
+        general = self._conf.general
+        settings = self._get_settings()
+        settings.append(os.path.abspath(self.pdfname))
+        settings.append('incremental=%s,volume_budget=%d,workers=%d' % (
+            general.incremental, general.volume_budget, self.workers))
+        h = hashlib.sha1()
+        for setting in settings:
+            h.update(setting.encode('utf-8') + b'\0')
+        for fname in self.files:
+            key = get_fragment_key(fname, [], self._encoding)
+            h.update(fname.encode('utf-8') + b'\0' + key.encode('ascii'))
+        return h.hexdigest()
+
+    def _get_fragment_name(self, key):
+        prefix = self._conf.general.download_dir
+        return os.path.join(prefix, FRAGMENT_DIR, key + '.pdf')
+
+    def _get_part_name(self, i):
+        root, ext = os.path.splitext(self.pdfname)
+        return '%s-%d%s' % (root, i, ext or '.pdf')
+
+    def _convert_files(self, files, pdfname):
+        convert = copy.copy(self)
+        convert.files = files
+        convert.pdfname = pdfname
+        convert.cmd = [self.path]
+        convert.run()
+
+    def _convert_parts(self, jobs):
+        """Convert jobs ([(files, pdfname)]), in parallel up to workers."""
+        workers = min(self.workers, len(jobs))
+        if workers <= 1:
+            for files, pdfname in jobs:
+                self._convert_files(files, pdfname)
+            return
+
+        # Converters run in subprocesses, so threads are enough.
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(self._convert_files, *job)
+                for job in jobs]
+            for future in futures:
+                future.result()
+
+    def _merge_parts(self, jobs):
+        from tosixinch import pdfmerge
+        pdfnames = [pdfname for _, pdfname in jobs]
+        if not pdfmerge.pypdf:
+            logger.warning(
+                '[pdf] pypdf is not installed, keeping %d PDF files: %s',
+                len(pdfnames), ', '.join(pdfnames))
+            return
+
+        documents, children = [], {}
+        for files, pdfname in jobs:
+            hname = get_merged_name(files, pdfname)
+            documents.append((pdfname, hname))
+            children[hname] = files
+        path2id = content.IDTable(None).path2id
+        merger = pdfmerge.DocumentMerger(documents, children, path2id)
+        merger.merge(self.pdfname)
+        for pdfname in pdfnames:
+            os.remove(pdfname)
+
+    def run_volumes(self, volumes):
+        """Convert each list of files to a numbered PDF, and concatenate.
+
+        Links between the volumes are rewritten,
+        when merging htmls (weasyprint) and concatenating PDFs.
+        """
+        jobs = [(files, self._get_part_name(i))
+            for i, files in enumerate(volumes, start=1)]
+        self._table = tuple((get_merged_name(files, pdfname), files)
+            for files, pdfname in jobs)
+        self._convert_parts(jobs)
+        self._merge_parts(jobs)
+
+    def _get_chapters(self):
+        """Return toc chapter numbers of files, from rfile directives.
+
+        Return ``None`` if toc is done (files are already chapters).
+        """
+        conf = self._conf
+        if self._toc_done or conf.general.raw or not conf._rfile:
+            return None
+        nodes = toc.Nodes(rsrcs=conf.sites._rsrcs,
+            rfile=conf._rfile, tocfile=None).nodes
+        chapters = {}
+        for i, node in enumerate(nodes):
+            for efile in node.children or [node.root]:
+                chapters[self.get_filename(efile)] = i
+        return [chapters.get(fname) for fname in self.files]
+
+    def run_split(self):
+        """Split files to volumes by estimated memory, and convert them."""
+        from tosixinch import volume
+        budget = self._conf.general.volume_budget * 2 ** 20
+        volumes = volume.split(self.files, budget, self._encoding,
+            chapters=self._get_chapters())
+        logger.info('[pdf] %r (%d volume(s))', self.pdfname, len(volumes))
+        if len(volumes) == 1:
+            return self.run()
+        self.run_volumes(volumes)
+
+    def run_incremental(self):
+        """Convert each html to a PDF (if not cached), and concatenate them."""
+        from tosixinch import pdfmerge
+        settings = self._get_settings()
+        documents, jobs = [], []
+        for fname in self.files:
+            key = get_fragment_key(fname, settings, self._encoding)
+            pdfname = self._get_fragment_name(key)
+            documents.append((pdfname, fname))
+            if not os.path.isfile(pdfname):
+                jobs.append((fname, pdfname))
+
+        logger.info('[pdf] %r (convert %d of %d fragments)',
+            self.pdfname, len(jobs), len(documents))
+        if jobs:
+            os.makedirs(os.path.dirname(jobs[0][1]), exist_ok=True)
+        # Convert to temporary names, not to cache interrupted ones.
+        tmpnames = [pdfname[:-4] + '.part.pdf' for _, pdfname in jobs]
+        self._convert_parts([([fname], tmpname)
+            for (fname, _), tmpname in zip(jobs, tmpnames)])
+        for (_, pdfname), tmpname in zip(jobs, tmpnames):
+            if os.path.isfile(tmpname):
+                os.replace(tmpname, pdfname)
+
+        # Not to make an incomplete PDF.
+        missing = [fname for pdfname, fname in documents
+            if not os.path.isfile(pdfname)]
+        if missing:
+            for fname in missing:
+                logger.error('[pdf] failed to convert %r', fname)
+            msg = '[pdf] failed to convert %d of %d fragments' % (
+                len(missing), len(documents))
+            raise FileNotFoundError(msg)
+        pdfmerge.DocumentMerger(documents).merge(self.pdfname)
+
 
 class PrinceConvert(Convert):
     """Run ``prince``.
@@ -166,13 +431,69 @@ class WeasyPrintConvert(Convert):
     http://weasyprint.org/
     """
 
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.api = conf.converter.api
+        if self.api and self.arguments:
+            logger.warning(
+                "[pdf] 'cnvopts' are not used with 'api' option: %r",
+                ' '.join(self.arguments))
+
     def run(self):
+        if self.api:
+            return self._run_api()
+
         self._add_css_arguments('--stylesheet')
         self._add_arguments()
         self._add_merged_files()
         self._add_pdfname()
         self._run()
 
+    def get_version(self):
+        if self.api:
+            import importlib.metadata
+            try:
+                return 'api ' + importlib.metadata.version('weasyprint')
+            except importlib.metadata.PackageNotFoundError:
+                return 'api'
+        return super().get_version()
+
+    def _convert_parts(self, jobs):
+        if not (self.api and self.workers > 1 and len(jobs) > 1):
+            return super()._convert_parts(jobs)
+
+        stylesheets = list(stylesheet.StyleSheet(self._conf).stylesheets2)
+        with concurrent.futures.ProcessPoolExecutor(
+                min(self.workers, len(jobs))) as executor:
+            futures = []
+            for files, pdfname in jobs:
+                hname = merge_htmls(files, pdfname,
+                    codings=self._encoding, table=self._table)
+                futures.append(executor.submit(
+                    _weasyprint_render, hname, pdfname, stylesheets))
+            for future in futures:
+                future.result()
+
+    def _run_api(self):
+        # Render in-process (by weasyprint library, not by the command).
+        # If workers > 1, render groups of files in worker processes,
+        # and concatenate the PDFs.
+        if self.workers > 1 and len(self.files) > 1:
+            from tosixinch import pdfmerge
+            if pdfmerge.pypdf:
+                groups = split_files(self.files, self.workers)
+                logger.info('[pdf] %r (weasyprint api, %d processes)',
+                    self.pdfname, len(groups))
+                return self.run_volumes(groups)
+            logger.warning('[pdf] pypdf is not installed, '
+                "converting in one process (ignoring 'workers')")
+
+        logger.info('[pdf] %r (weasyprint api)', self.pdfname)
+        stylesheets = list(stylesheet.StyleSheet(self._conf).stylesheets2)
+        hname = merge_htmls(self.files, self.pdfname,
+            codings=self._encoding, table=self._table)
+        _weasyprint_render(hname, self.pdfname, stylesheets)
+
 
 def run(conf):
     converter = conf.general.converter
@@ -183,4 +504,36 @@ def run(conf):
     else:
         raise KeyError('unknown converter: %s' % converter)
 
-    convert.run()
+    manifest = system.Manifest(
+        os.path.join(conf.general.download_dir, MANIFEST))
+    key = None
+    if not conf.general.force_convert:
+        key = convert.get_key()
+        if manifest.check(convert.pdfname, key):
+            logger.info('[pdf] %r (not changed, skipping)', convert.pdfname)
+            return
+
+    incremental = conf.general.incremental
+    if incremental:
+        from tosixinch import pdfmerge
+        if not pdfmerge.pypdf:
+            logger.warning("[pdf] pypdf is not installed, "
+                "converting without 'incremental'")
+            incremental = False
+
+    start = time.time()
+    if incremental:
+        convert.run_incremental()
+    elif conf.general.volume_budget:
+        convert.run_split()
+    else:
+        convert.run()
+
+    # Record only when the converter actually made the file.
+    pdfname = convert.pdfname
+    if os.path.isfile(pdfname) and os.path.getmtime(pdfname) >= int(start):
+        if conf.general.force_convert:
+            key = convert.get_key()
+        if key:
+            manifest.record(pdfname, key)
+            manifest.save()
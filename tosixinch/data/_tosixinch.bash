@@ -6,7 +6,7 @@ _tosixinch()
     _init_completion -s || return
 
     case $prev in
-        --add-binary-extensions|--add-clean-attrs|--add-clean-tags|--cnvopts|--css2|--download-dir|--elements-to-keep-attrs|--font-family|--font-mono|--font-sans|--font-scale|--font-serif|--font-size|--font-size-mono|--full-image|--guess|--interval|--landscape-size|--line-height|--pdfname|--portrait-size|--post-each-cmd1|--post-each-cmd2|--postcmd1|--postcmd2|--postcmd3|--pre-each-cmd1|--pre-each-cmd2|--precmd1|--precmd2|--precmd3|--selenium-chrome-path|--selenium-firefox-path|--styles-to-retain|--textindent|--textwidth|--timeout|--toc-depth|--trimdirs|--user-agent|--viewcmd)
+        --add-binary-extensions|--add-clean-attrs|--add-clean-tags|--cnvopts|--css2|--download-dir|--downscale-dpi|--elements-to-keep-attrs|--extract-report|--font-family|--font-mono|--font-sans|--font-scale|--font-serif|--font-size|--font-size-mono|--full-image|--guess|--interval|--landscape-size|--line-height|--pdfname|--portrait-size|--post-each-cmd1|--post-each-cmd2|--postcmd1|--postcmd2|--postcmd3|--pre-each-cmd1|--pre-each-cmd2|--precmd1|--precmd2|--precmd3|--selenium-chrome-path|--selenium-firefox-path|--styles-to-retain|--textindent|--textwidth|--timeout|--toc-depth|--trimdirs|--user-agent|--viewcmd|--volume-budget|--workers)
             return
             ;;
         --browser-engine)
@@ -49,7 +49,7 @@ _tosixinch()
 
     $split && return
 
-    COMPREPLY=( $( compgen -W '--add-binary-extensions --add-clean-attrs --add-clean-tags --appcheck --browser --browser-engine --check --clean --cnvopts --cnvpath --convert --css2 --download --download-dir --elements-to-keep-attrs --encoding --encoding-errors --extract --file --font-family --font-mono --font-sans --font-scale --font-serif --font-size --font-size-mono --force-download --ftype --full-image --guess --headless --help --input --inspect --interval --keep-html --landscape-size --line-height --lxml --no-parts-download --nouserdir --orientation --overwrite-html --parts-download --pdfname --portrait-size --post-each-cmd1 --post-each-cmd2 --postcmd1 --postcmd2 --postcmd3 --pre-each-cmd1 --pre-each-cmd2 --precmd1 --precmd2 --precmd3 --prince --printout --quiet --raw --selenium-chrome-path --selenium-firefox-path --styles-to-retain --textindent --textwidth --timeout --toc --toc-depth --trimdirs --urllib --user-agent --userdir --verbose --version --view --viewcmd --weasyprint' -- "$cur" ) )
+    COMPREPLY=( $( compgen -W '--add-binary-extensions --add-clean-attrs --add-clean-tags --appcheck --browser --browser-engine --check --clean --cnvopts --cnvpath --convert --css2 --dedup --download --download-dir --downscale-dpi --elements-to-keep-attrs --encoding --encoding-errors --externalize-data-url --extract --extract-report --file --font-family --font-mono --font-sans --font-scale --font-serif --font-size --font-size-mono --force-convert --force-download --force-toc --ftype --full-image --guess --headless --help --incremental --input --inspect --interval --keep-html --landscape-size --line-height --lxml --no-parts-download --nouserdir --orientation --overwrite-html --parts-download --pdfname --pipeline --portrait-size --post-each-cmd1 --post-each-cmd2 --postcmd1 --postcmd2 --postcmd3 --pre-each-cmd1 --pre-each-cmd2 --precmd1 --precmd2 --precmd3 --prince --printout --quiet --raw --selenium-chrome-path --selenium-firefox-path --styles-to-retain --textindent --textwidth --timeout --toc --toc-depth --trimdirs --urllib --user-agent --userdir --verbose --version --view --viewcmd --volume-budget --weasyprint --workers' -- "$cur" ) )
     [[ $COMPREPLY == *= ]] && compopt -o nospace
 
 } &&
@@ -0,0 +1,113 @@
+
+"""Detect the same documents in different rsrcs.
+
+Crawled rsrc lists often have the same article in different URLs
+(tracking queries, AMP or print versions etc.).
+When 'dedup' option is ``True``,
+the later ones are skipped in ``extract``, ``toc`` and ``convert``.
+
+Documents are compared by checksums, in two ways:
+
+dfile: text with whitespaces collapsed
+efile: body text with whitespaces collapsed, and image paths
+"""
+
+import hashlib
+import logging
+import os
+import posixpath
+import re
+
+from tosixinch import lxml_html
+from tosixinch import system
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(text):
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+def dfile_checksum(text):
+    text = _normalize(text)
+    if not text:
+        return None
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def efile_checksum(doc, efile):
+    """Calculate checksum from body, or return ``None`` if it is empty."""
+    body = doc.body
+    if body is None:
+        return None
+
+    text = _normalize(' '.join(body.itertext()))
+    # Image paths are relative to efiles, so make them relative to current.
+    dirname = posixpath.dirname(efile)
+    srcs = [posixpath.normpath(posixpath.join(dirname, el.get('src')))
+        for el in body.iter('img') if el.get('src')]
+    if not text and not srcs:
+        return None
+
+    h = hashlib.sha1(text.encode('utf-8'))
+    for src in srcs:
+        h.update(b'\0' + src.encode('utf-8'))
+    return h.hexdigest()
+
+
+class Deduplicator(system._File):
+    """Keep checksums of sites, and check duplicates."""
+
+    def __init__(self):
+        self._dfiles = {}  # {checksum: site}
+        self._efiles = {}
+        self.duplicates = []  # [(site, original site)]
+
+    def _check(self, checksums, site, checksum, kind):
+        if checksum is None:
+            return False
+        original = checksums.setdefault(checksum, site)
+        if original is site:
+            return False
+        logger.info('[dedup] %s (the same %s as %s)',
+            site.rsrc, kind, original.rsrc)
+        self.duplicates.append((site, original))
+        return True
+
+    def check_dfile(self, site):
+        """Return ``True`` if dfile is the same as one of previous ones."""
+        checksum = dfile_checksum(site.text)
+        return self._check(self._dfiles, site, checksum, 'dfile')
+
+    def check_efile(self, site):
+        """Return ``True`` if efile is the same as one of previous ones."""
+        efile = site.efile
+        codings = site.general.encoding
+        errors = site.general.encoding_errors
+        doc = lxml_html.read(
+            efile, codings=codings, errors=errors, cache='share')
+        checksum = efile_checksum(doc, efile)
+        return self._check(self._efiles, site, checksum, 'efile')
+
+    def filter(self, sites):
+        """Return sites, removing duplicates."""
+        new = []
+        for site in sites:
+            dfile = self.get_filename(site.dfile)
+            if os.path.isfile(dfile) and self.check_dfile(site):
+                continue
+            efile = self.get_filename(site.efile)
+            if os.path.isfile(efile) and self.check_efile(site):
+                continue
+            new.append(site)
+        if self.duplicates:
+            num = len(self.duplicates)
+            logger.info('[dedup] skipped %d duplicate(s)', num)
+        return new
+
+    def get_duplicates(self, sites):
+        """Return a set of rsrcs of duplicate sites."""
+        self.filter(sites)
+        return {site.rsrc for site, original in self.duplicates}
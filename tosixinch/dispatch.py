@@ -2,25 +2,30 @@
 """Dispath actions."""
 
 import logging
+import queue
 import re
+import threading
 
 from tosixinch import system
 
 logger = logging.getLogger(__name__)
 
 _CLEANUP = []
+_CLEANUP_LOCK = threading.Lock()  # for pipeline (the download thread)
 
 
 def add_cleanup(f, *args, **kwargs):
-    _CLEANUP.append([f, args, kwargs])
+    with _CLEANUP_LOCK:
+        _CLEANUP.append([f, args, kwargs])
 
 
 def _run_cleanup():
     global _CLEANUP
 
-    for f, args, kwargs in _CLEANUP:
+    with _CLEANUP_LOCK:
+        cleanup, _CLEANUP = _CLEANUP, []
+    for f, args, kwargs in cleanup:
         f(*args, **kwargs)
-    _CLEANUP = []
 
 
 def _action_run(conf, command, precmd, postcmd):
@@ -45,15 +50,19 @@ def _sub_action_dispatch(conf, command, pre_each_cmd, post_each_cmd):
 
     def _runner(conf):
         for site in conf.sites:
-            returncode = system.run_cmds(pre_each_cmd, conf, site)
-            if returncode not in (101, 102):
-                command(conf, site)
-            if returncode not in (102,):
-                returncode = system.run_cmds(post_each_cmd, conf, site)
+            _sub_action_run(conf, site, command, pre_each_cmd, post_each_cmd)
 
     return _runner
 
 
+def _sub_action_run(conf, site, command, pre_each_cmd, post_each_cmd):
+    returncode = system.run_cmds(pre_each_cmd, conf, site)
+    if returncode not in (101, 102):
+        command(conf, site)
+    if returncode not in (102,):
+        system.run_cmds(post_each_cmd, conf, site)
+
+
 def _download(conf):
     _action_dispatch(conf, _get_downloader(conf),
         conf.general.precmd1, conf.general.postcmd1,
@@ -81,12 +90,16 @@ def _is_html(dfile, text, max_chars=4096):
 
 def _set_ftypes(conf):
     for site in conf.sites:
-        site.ftype = site.general.ftype.lower()
-        if site.ftype:
-            continue
+        _set_ftype(site)
+
 
-        if _is_html(site.dfile, site.text):
-            site.ftype = 'html'
+def _set_ftype(site):
+    site.ftype = site.general.ftype.lower()
+    if site.ftype:
+        return
+
+    if _is_html(site.dfile, site.text):
+        site.ftype = 'html'
 
 
 def _extract(conf):
@@ -98,18 +111,104 @@ def _extract(conf):
 
 
 def _get_extractor(conf):
+    deduplicator = None
+    if conf.general.dedup:
+        from tosixinch import dedup
+        deduplicator = dedup.Deduplicator()
 
     def _runner(conf, site):
+        if deduplicator and deduplicator.check_dfile(site):
+            return
         if site.ftype == 'html':
             from tosixinch import extract
-            return extract.run(conf, site)
+            extract.run(conf, site)
         else:
             from tosixinch import textformat
-            return textformat.run(conf, site)
+            textformat.run(conf, site)
+        if deduplicator:
+            deduplicator.check_efile(site)
 
     return _runner
 
 
+# Pipeline (download and extract, overlapped per site)
+#
+# The download thread puts sites in a bounded queue,
+# and the main thread extracts them as they come.
+# 'precmd2' runs before the first extract (downloads may be still going),
+# 'postcmd1' runs after the last download.
+# Cleanups (of both stages) run once, after the download thread is joined.
+
+PIPELINE_QUEUE_SIZE = 4
+
+_PIPELINE_END = object()
+
+
+def _download_stage(conf, sites, stop, errors):
+    general = conf.general
+    command = _get_downloader(conf)
+    try:
+        returncode = system.run_cmds(general.precmd1, conf)
+        for site in conf.sites:
+            if stop.is_set():
+                break
+            if returncode not in (101, 102):
+                _sub_action_run(conf, site, command,
+                    general.pre_each_cmd1, general.post_each_cmd1)
+            sites.put(site)
+        else:
+            if returncode not in (102,):
+                system.run_cmds(general.postcmd1, conf)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        sites.put(_PIPELINE_END)
+
+
+def _extract_stage(conf, sites):
+    general = conf.general
+    command = _get_extractor(conf)
+    returncode = system.run_cmds(general.precmd2, conf)
+    while True:
+        site = sites.get()
+        if site is _PIPELINE_END:
+            break
+        if returncode not in (101, 102):
+            _set_ftype(site)
+            _sub_action_run(conf, site, command,
+                general.pre_each_cmd2, general.post_each_cmd2)
+    return returncode
+
+
+def _drain(sites):
+    while sites.get() is not _PIPELINE_END:
+        pass
+
+
+def _pipeline(conf):
+    sites = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+    thread = threading.Thread(
+        target=_download_stage, args=(conf, sites, stop, errors))
+    thread.start()
+    try:
+        returncode = _extract_stage(conf, sites)
+    except BaseException:
+        stop.set()
+        _drain(sites)
+        raise
+    finally:
+        thread.join()
+        _run_cleanup()
+
+    if errors:
+        raise errors[0]
+
+    if returncode not in (102,):
+        system.run_cmds(conf.general.postcmd2, conf)
+
+
 def _convert(conf):
     _action_run(conf, _get_converter(conf),
         conf.general.precmd3, conf.general.postcmd3)
@@ -129,10 +228,21 @@ def main_dispatch(conf, args):
     def _view(conf):
         system.run_cmds(conf.general.viewcmd, conf)
 
-    if args.download:
-        _download(conf)
-    if args.extract:
-        _extract(conf)
+    report = (args.download or args.extract) and conf.general.extract_report
+    if report:
+        from tosixinch import instrument
+        instrument.start()
+    try:
+        if args.download and args.extract and conf.general.pipeline:
+            _pipeline(conf)
+        else:
+            if args.download:
+                _download(conf)
+            if args.extract:
+                _extract(conf)
+    finally:
+        if report:
+            instrument.stop(report)
     if args.toc:
         _toc(conf)
     if args.convert:
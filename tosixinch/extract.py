@@ -10,16 +10,29 @@
 """
 
 import copy
+import hashlib
+import io
 import logging
+import mimetypes
 import os
 
 from tosixinch import action
 from tosixinch import clean
 from tosixinch import content
+from tosixinch import instrument
+from tosixinch import location
 from tosixinch import system
 
 logger = logging.getLogger(__name__)
 
+_warned = set()
+
+
+def _warn_once(msg):
+    if msg not in _warned:
+        _warned.add(msg)
+        logger.warning(msg)
+
 
 class Extract(action.Extractor):
     """Provide actual extractor with config data."""
@@ -60,12 +73,26 @@ class Extract(action.Extractor):
             doc = content.build_new_html(
                 doctype=self.doctype, title=title)
         else:
-            doc = copy.deepcopy(self.root)
-            for el in doc.body:
-                doc.body.remove(el)
+            doc = self._copy_root()
 
         self.doc = doc
 
+    def _copy_root(self):
+        # Copy the document without body content.
+        # (detach body children while copying, not to copy the whole page)
+        body = self.root.body
+        if body is None:
+            return copy.deepcopy(self.root)
+
+        children = list(body)
+        for el in children:
+            body.remove(el)
+        try:
+            doc = copy.deepcopy(self.root)
+        finally:
+            body.extend(children)
+        return doc
+
     def guess_selection(self):
         for guess in self._guess:
             sel = self.root.xpath(guess)
@@ -84,8 +111,9 @@ class Extract(action.Extractor):
                     t.getparent().remove(t)
 
     def process(self):
-        for s in self.sp:
-            system.run_function(self._conf._userdir, 'process', self.doc, s)
+        userdir = self._conf._userdir
+        for func in system.get_functions(userdir, 'process', self.sp):
+            self._step(func, self.doc, name='process:%s' % func.name)
 
     def clean(self):
         if self._site.general.clean in ('head', 'none'):
@@ -110,16 +138,27 @@ class Extract(action.Extractor):
             doc = self.doc
         super().write(doc)
 
+    def _count(self):
+        doc = getattr(self, 'doc', None)
+        if doc is None:
+            doc = getattr(self, 'root', None)
+        return instrument.count_elements(doc)
+
+    def _step(self, func, *args, name=None):
+        name = name or func.__name__
+        with instrument.record(self.section, name, self._count):
+            func(*args)
+
     def run(self):
-        self.load()
-        self.build()
-        self.select()
-        self.exclude()
-        self.process()
-        self.clean()
-        self.resolve()
-        self.add_css_elememnt()
-        self.write()
+        self._step(self.load)
+        self._step(self.build)
+        self._step(self.select)
+        self._step(self.exclude)
+        self._step(self.process)
+        self._step(self.clean)
+        self._step(self.resolve)
+        self._step(self.add_css_elememnt)
+        self._step(self.write)
 
 
 class KeepExtract(Extract):
@@ -130,39 +169,103 @@ class KeepExtract(Extract):
     """
 
     def run(self):
-        self.load()
-        self.resolve(self.root)
-        self.write(self.root)
+        self._step(self.load)
+        self._step(self.resolve, self.root)
+        self._step(self.write, self.root)
 
 
 class Resolver(content.Resolver):
     """Download components and rewrite links."""
 
+    DATA_DIR = '_data'
+
     def __init__(self, doc, loc, locs, baseurl, conf):
         super().__init__(doc, loc, locs, baseurl)
         self._conf = conf
+        self._externalize = loc.general.externalize_data_url
+        self._scaler = self._get_scaler()
+
+    def _get_scaler(self):
+        dpi = self.loc.general.downscale_dpi
+        if dpi:
+            from tosixinch import imagescale  # Pillow is imported lazily
+            if not imagescale.Image:
+                _warn_once("'downscale_dpi' requires Pillow, images are "
+                    'not resized (Pillow seems not installed)')
+                return None
+            width = imagescale.get_target_width(self._conf.pdfsize, dpi)
+            return imagescale.Scaler(self.loc.PREFIX, width)
+
+    def resolve(self):
+        self._images = []  # (element, dfile), to get sizes in a batch
+        super().resolve()
+        if self._externalize:
+            self.externalize_data_urls()
+        self._add_components_attributes()
 
     def _get_component(self, el, comp):
         self._download_component(comp)
-        self._add_component_attributes(el, comp.dfile)
+        if el.tag == 'img':
+            self._scale_component(comp)
+            self._images.append((el, comp.dfile))
+
+    def _get_data_component(self, el, attr):
+        # If externalizing, do it later, not to resolve the new links.
+        if self._externalize:
+            return
+        _, data = content.decode_data_url(el.get(attr))
+        if data and el.tag == 'img':
+            w, h = content.get_component_size(el, None, io.BytesIO(data))
+            self._add_component_attributes(el, w, h)
 
     def _set_component(self, comp):
         if os.path.isfile(comp.dfile):
             super()._set_component(comp)
 
     def _download_component(self, comp):
-        url = comp.url
-        if url.startswith('data:image/'):
-            return
         downloader = CompDownloader(self._conf, self.loc)
         downloader.download(comp)
 
-    def _add_component_attributes(self, el, dfile):
-        if el.tag != 'img':
+    def _scale_component(self, comp):
+        # Point to the resized image file (if any), instead of the original.
+        if self._scaler:
+            dfile = self._scaler.scale(comp.dfile)
+            if dfile:
+                comp.dfile = dfile
+
+    def externalize_data_urls(self):
+        """Write 'data:' URL images to files, and rewrite links to them."""
+        for el in self.doc.iter('img'):
+            url = el.get('src', '')
+            if not content.is_data_url(url):
+                continue
+            fname = self._write_data_url(url)
+            if fname and self._scaler:
+                fname = self._scaler.scale(fname) or fname
+            if fname:
+                el.set('src', location.path2ref(fname, self.loc.efile))
+                self._images.append((el, fname))
+
+    def _write_data_url(self, url):
+        # Content-addressed, so the same images are written only once.
+        mime, data = content.decode_data_url(url)
+        if data is None:
             return
-
+        ext = mimetypes.guess_extension(mime) or ''
+        name = hashlib.sha1(data).hexdigest() + ext
+        fname = '/'.join((self.loc.PREFIX, self.DATA_DIR, name))
+        if not os.path.isfile(fname):
+            logger.info('[data] %s (%s, %d bytes)', fname, mime, len(data))
+            system.write(fname, data)
+        return fname
+
+    def _add_components_attributes(self):
+        sizes = content.get_component_sizes(self._images)
+        for (el, dfile), (w, h) in zip(self._images, sizes):
+            self._add_component_attributes(el, w, h)
+
+    def _add_component_attributes(self, el, w, h):
         full = self.loc.general.full_image
-        w, h = content.get_component_size(el, dfile)
         if w and h:
             length = max(w, h)
             if length >= full:
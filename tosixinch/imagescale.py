@@ -0,0 +1,125 @@
+
+"""Downscale large images to the PDF page width, before conversion.
+
+It uses ``Pillow`` library (optional).
+
+Converters embed images in full resolution,
+so a few large photos can make conversion slow and PDF files big.
+Here, images wider than the page width (in a specified dpi) are resized,
+and written as new files (we don't touch downloaded component files).
+
+The new file names are checksums of the original content and the settings,
+so the same images are not resized again.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+
+from tosixinch import _ImportError
+from tosixinch import system
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = _ImportError('Pillow')
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = '_derived'
+VERSION = 1  # change when resizing is changed, to make new files
+
+JPEG_QUALITY = 85
+
+# Pillow format names and file extensions, to resize.
+# (Others, e.g. gif and svg, are left as is.)
+FORMATS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+# errors for broken or too large images, to skip them
+ERRORS = (OSError, ValueError)
+if Image:
+    ERRORS += (Image.DecompressionBombError,)
+
+# {(fname, mtime, size, prefix, width): new fname or None}
+_cache = {}
+
+UNITS = {  # to inch
+    'mm': 1 / 25.4, 'cm': 1 / 2.54, 'in': 1,
+    'pt': 1 / 72, 'pc': 1 / 6, 'px': 1 / 96, '': 1 / 96,
+}
+
+
+def get_target_width(pdfsize, dpi):
+    """Return page width in pixels, from pdfsize (e.g. '90mm 118mm')."""
+    width = pdfsize.split()[0]
+    match = re.match(r'^([0-9.]+)([a-z]*)$', width.lower())
+    if not match or match[2] not in UNITS:
+        raise ValueError('unknown pdfsize width: %r' % width)
+    return int(float(match[1]) * UNITS[match[2]] * dpi)
+
+
+class Scaler(object):
+    """Resize images to a width, and return the new file names."""
+
+    def __init__(self, prefix, width):
+        self.prefix = prefix
+        self.width = width
+
+    def _get_name(self, data, ext):
+        settings = '%d:%d:%d' % (VERSION, self.width, JPEG_QUALITY)
+        h = hashlib.sha1(data)
+        h.update(settings.encode('ascii'))
+        return '/'.join((self.prefix, DERIVED_DIR, h.hexdigest() + ext))
+
+    def _resize(self, im, fname):
+        height = max(round(im.height * self.width / im.width), 1)
+        new = im.resize((self.width, height), Image.LANCZOS)
+        kwargs = {}
+        if im.format == 'JPEG':
+            kwargs['quality'] = JPEG_QUALITY
+        if im.info.get('exif'):
+            kwargs['exif'] = im.info['exif']  # e.g. orientation
+        if im.info.get('icc_profile'):
+            kwargs['icc_profile'] = im.info['icc_profile']
+        f = io.BytesIO()
+        new.save(f, format=im.format, **kwargs)
+        system.download_write(fname, f.getvalue())
+
+    def _scale(self, fname):
+        with open(fname, 'rb') as f:
+            data = f.read()
+        with Image.open(io.BytesIO(data)) as im:
+            if im.format not in FORMATS:
+                return None
+            if getattr(im, 'is_animated', False):
+                return None
+            if im.width <= self.width:
+                return None
+
+            new = self._get_name(data, FORMATS[im.format])
+            if not os.path.isfile(new):
+                logger.info('[downscale] %s (%dx%d -> width %d)',
+                    fname, im.width, im.height, self.width)
+                self._resize(im, new)
+            return new
+
+    def scale(self, fname):
+        """Return the resized file name, or ``None`` if not resized."""
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return None
+        key = fname, stat.st_mtime_ns, stat.st_size, self.prefix, self.width
+        if key not in _cache:
+            try:
+                _cache[key] = self._scale(fname)
+            except ERRORS as e:
+                logger.debug('[downscale] failed: %s (%s)', fname, e)
+                _cache[key] = None
+        return _cache[key]
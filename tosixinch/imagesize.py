@@ -9,6 +9,8 @@
 # - Deleted many file format functions,
 #   we need only the most popular ones used in html.
 # - Errors are made more lenient, and concentrated in a few places.
+# - Read a header at once (by ``os.pread``) and close the file.
+# - Added webp, tiff, avif and svg.
 
 # ----------------------------------------------------------
 
@@ -23,54 +25,232 @@ add rgbsize rassize pcxsize function
 New BSD license
 """
 
+import os
 import re
+import struct
 from struct import unpack
 
+HEADER_SIZE = 4096  # bytes to read first (most formats need less)
+SVG_HEADER_SIZE = 65536  # for svg, search root element up to this size
 
-def _jpegsize(stream):
-    x = y = 0
-    # Skip the match.
-    stream.read(2)
+
+class _Source(object):
+    """Read bytes at offsets, from the header or further from the file."""
+
+    def __init__(self, read_at):
+        self._read_at = read_at
+        self.header = read_at(0, HEADER_SIZE)
+
+    def read(self, offset, size):
+        end = offset + size
+        if end <= len(self.header):
+            return self.header[offset:end]
+        return self._read_at(offset, size)
+
+    def unpack(self, fmt, offset):
+        size = struct.calcsize(fmt)
+        data = self.read(offset, size)
+        if len(data) < size:
+            raise ValueError('Unexpected end of file')
+        return unpack(fmt, data)
+
+
+def _jpegsize(src):
+    # https://www.w3.org/Graphics/JPEG/itu-t81.pdf (B.1.1.3)
+    # SOFn markers, except DHT (C4), JPG (C8) and DAC (CC).
+    sof = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+    # Markers without length: TEM, RSTn, SOI, EOI.
+    standalone = {0x01} | set(range(0xD0, 0xDA))
+    offset = 2  # Skip the match.
     while True:
-        # Extract the segment header.
-        (marker, code, length) = unpack('>BBH', stream.read(4))
+        marker, code = src.unpack('>BB', offset)
         if marker != 0xFF:
             # Not valid jpeg.
-            break
-        elif code >= 0xC0 and code <= 0xC3:
-            y, x = unpack('>xHH', stream.read(5))
-            break
-        else:
-            # Skip to the next marker.
-            stream.read(length - 2)
-    if x and y:
-        return 'jpeg', x, y
+            return
+        if code == 0xFF:  # fill bytes
+            offset += 1
+            continue
+        if code in standalone:
+            offset += 2
+            continue
+        length, = src.unpack('>H', offset + 2)
+        if code in sof:
+            y, x = src.unpack('>xHH', offset + 4)
+            return 'jpeg', x, y
+        offset += 2 + length
 
 
-def _pngsize(stream):
+def _pngsize(src):
     # https://www.w3.org/TR/PNG/#11IHDR
     # Skip the match and 'chunk length' (8 + 4).
-    stream.read(12)
-    if stream.read(4) == b'IHDR':
-        x, y = unpack('>LL', stream.read(8))
+    if src.read(12, 4) == b'IHDR':
+        x, y = src.unpack('>LL', 16)
         return 'png', x, y
 
 
-def _gifsize(stream):
+def _gifsize(src):
     # https://www.w3.org/Graphics/GIF/spec-gif89a.txt
     # Return 'Logical Screen Width' and 'Logical Screen Height'.
-    # Skip the match.
-    stream.read(6)
-    lsw, lsh = unpack('<HH', stream.read(4))
+    lsw, lsh = src.unpack('<HH', 6)
     return 'gif', lsw, lsh
 
 
-def _bmpsize(stream):
+def _bmpsize(src):
     # https://en.wikipedia.org/wiki/BMP_file_format
-    # Skip 'BITMAPFILEHEADER' and header of 'BITMAPINFOHEADER' (14 + 4).
-    stream.read(18)
-    x, y = unpack('<LL', stream.read(8))
-    return 'bmp', x, y
+    # Skip 'BITMAPFILEHEADER' (14), and read the header size.
+    size, = src.unpack('<L', 14)
+    if size == 12:  # 'BITMAPCOREHEADER'
+        x, y = src.unpack('<HH', 18)
+    else:
+        x, y = src.unpack('<ll', 18)  # height is negative if top-down
+    return 'bmp', abs(x), abs(y)
+
+
+def _webpsize(src):
+    # https://developers.google.com/speed/webp/docs/riff_container
+    chunk = src.read(12, 4)
+    if chunk == b'VP8 ':
+        # 'frame tag' (3) and 'start code' (3)
+        x, y = src.unpack('<HH', 26)
+        return 'webp', x & 0x3FFF, y & 0x3FFF
+    if chunk == b'VP8L':
+        # 'signature' (1), then 14 bits width - 1 and 14 bits height - 1
+        bits, = src.unpack('<L', 21)
+        return 'webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        # 'flags' (4), then 24 bits width - 1 and 24 bits height - 1
+        data = src.read(24, 6)
+        if len(data) == 6:
+            x = int.from_bytes(data[:3], 'little') + 1
+            y = int.from_bytes(data[3:], 'little') + 1
+            return 'webp', x, y
+
+
+def _tiffsize(src):
+    # https://www.itu.int/itudoc/itu-t/com16/tiff-fx/docs/tiff6.pdf
+    # Read 'ImageWidth' (256) and 'ImageLength' (257) in the first IFD.
+    order = '<' if src.read(0, 2) == b'II' else '>'
+    offset, = src.unpack(order + 'L', 4)
+    num, = src.unpack(order + 'H', offset)
+    size = {}
+    for i in range(num):
+        tag, type_ = src.unpack(order + 'HH', offset + 2 + i * 12)
+        if tag not in (256, 257):
+            continue
+        fmt = 'H' if type_ == 3 else 'L'  # SHORT or LONG
+        size[tag], = src.unpack(order + fmt, offset + 2 + i * 12 + 8)
+        if len(size) == 2:
+            return 'tiff', size[256], size[257]
+
+
+def _iter_boxes(src, offset, end):
+    # ISO base media file format (ISO/IEC 14496-12) boxes
+    while end is None or offset + 8 <= end:
+        data = src.read(offset, 8)
+        if len(data) < 8:
+            return
+        size, name = unpack('>L4s', data)
+        header = 8
+        if size == 1:
+            size, = src.unpack('>Q', offset + 8)
+            header = 16
+        elif size == 0:  # to the end
+            size = (end - offset) if end else 2 ** 63
+        if size < header:
+            return
+        yield name, offset + header, offset + size
+        offset += size
+
+
+def _find_box(src, names, offset=0, end=None):
+    name, *rest = names
+    for name_, start, end_ in _iter_boxes(src, offset, end):
+        if name_ == name:
+            if name == b'meta':  # full box ('version' and 'flags')
+                start += 4
+            if rest:
+                return _find_box(src, rest, start, end_)
+            return start, end_
+
+
+def _avifsize(src):
+    # https://aomediacodec.github.io/av1-avif/
+    # Read 'ispe' (image spatial extents) properties.
+    # Items are not associated, the largest one is taken as the main image.
+    ftyp = _find_box(src, [b'ftyp'])
+    if not ftyp or b'avi' not in src.read(ftyp[0], ftyp[1] - ftyp[0]):
+        return
+    ipco = _find_box(src, [b'meta', b'iprp', b'ipco'])
+    if not ipco:
+        return
+    sizes = []
+    for name, start, end in _iter_boxes(src, *ipco):
+        if name == b'ispe':
+            sizes.append(src.unpack('>LL', start + 4))
+    if sizes:
+        x, y = max(sizes, key=lambda size: size[0] * size[1])
+        return 'avif', x, y
+
+
+SVG_ROOT_RE = re.compile(br'<svg(\s[^>]*)?>', flags=re.IGNORECASE)
+SVG_ATTR_RE = re.compile(br"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+SVG_LENGTH_RE = re.compile(r'^\s*([0-9.]+(?:e[+-]?[0-9]+)?)\s*([a-z]*)\s*$')
+SVG_UNITS = {  # to px
+    '': 1, 'px': 1, 'pt': 4 / 3, 'pc': 16, 'in': 96, 'cm': 96 / 2.54,
+    'mm': 96 / 25.4,
+}
+
+
+def _svglength(value):
+    if value is None:
+        return None
+    match = SVG_LENGTH_RE.match(value.lower())
+    if match and match[2] in SVG_UNITS:
+        return float(match[1]) * SVG_UNITS[match[2]]
+    return None  # e.g. '100%', 'auto'
+
+
+def _svgsize(src):
+    # https://www.w3.org/TR/SVG2/geometry.html#Sizing
+    data = src.read(0, SVG_HEADER_SIZE)
+    match = SVG_ROOT_RE.search(data)
+    if not match:
+        return
+    attrs = {}
+    for m in SVG_ATTR_RE.finditer(match[1] or b''):
+        value = m[2] if m[2] is not None else m[3]
+        attrs[m[1].decode('ascii')] = value.decode('utf-8', 'replace')
+
+    x = _svglength(attrs.get('width'))
+    y = _svglength(attrs.get('height'))
+    viewbox = re.split(r'[\s,]+', attrs.get('viewBox', '').strip())
+    if len(viewbox) == 4:
+        try:
+            vw, vh = float(viewbox[2]), float(viewbox[3])
+        except ValueError:
+            vw = vh = 0
+        if vw > 0 and vh > 0:
+            if x and not y:
+                y = x * vh / vw
+            elif y and not x:
+                x = y * vw / vh
+            elif not x and not y:
+                x, y = vw, vh
+    if x and y:
+        return 'svg', x, y
+
+
+def _is_webp(data):
+    return data[:4] == b'RIFF' and data[8:12] == b'WEBP'
+
+
+def _is_avif(data):
+    return data[4:8] == b'ftyp'
+
+
+def _is_svg(data):
+    data = data.lstrip(b'\xef\xbb\xbf \t\r\n')
+    return data[:1] == b'<' and SVG_ROOT_RE.search(data) is not None
 
 
 TYPE_MAP = {
@@ -78,6 +258,10 @@ TYPE_MAP = {
     re.compile(br'^\x89PNG\x0d\x0a\x1a\x0a'): ('png', _pngsize),
     re.compile(br'^GIF8[79]a'):               ('gif', _gifsize),  # noqa: E241
     re.compile(br'^BM'):                      ('bmp', _bmpsize),  # noqa: E241
+    re.compile(br'^(II\*\x00|MM\x00\*)'):     ('tiff', _tiffsize),  # noqa: E501,E241
+    _is_webp:                                 ('webp', _webpsize),  # noqa: E501,E241
+    _is_avif:                                 ('avif', _avifsize),  # noqa: E501,E241
+    _is_svg:                                  ('svg', _svgsize),  # noqa: E241
 }
 
 TYPES = ', '.join([TYPE_MAP[key][0] for key in TYPE_MAP])
@@ -86,22 +270,21 @@ TYPES = ', '.join([TYPE_MAP[key][0] for key in TYPE_MAP])
 def _type_match(data):
     """Parse bytes and return mime-type and callback function."""
     for key in TYPE_MAP:
-        if key.match(data):
+        match = key.match if isinstance(key, re.Pattern) else key
+        if match(data):
             return TYPE_MAP[key]
     else:
         return None, None
 
 
-def get_size(filename=None, stream=None):
-    """Return image format, width and hight."""
-    if not stream:
-        stream = open(filename, 'rb')
-    data = stream.read(512)
-    stream.seek(0, 0)
+def _get_size(src):
     ret = None
-    mime, callback = _type_match(data)
+    mime, callback = _type_match(src.header)
     if mime and callback:
-        ret = callback(stream)
+        try:
+            ret = callback(src)
+        except struct.error:
+            ret = None
     else:
         raise ValueError('Unable to Recognize (%s)' % TYPES)
     if ret:
@@ -111,6 +294,67 @@ def get_size(filename=None, stream=None):
     raise ValueError('Unable to get size. (%s)' % mime)
 
 
+def _from_stream(stream):
+    def read_at(offset, size):
+        stream.seek(offset, 0)
+        return stream.read(size)
+
+    try:
+        return _get_size(_Source(read_at))
+    finally:
+        stream.seek(0, 0)
+
+
+def _from_file(filename):
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        return _get_size(_Source(lambda offset, size:
+            os.pread(fd, size, offset)))
+    finally:
+        os.close(fd)
+
+
+# {filename: ((mtime, size), result or ValueError)}
+_cache = {}
+
+
+def get_size(filename=None, stream=None):
+    """Return image format, width and hight."""
+    if stream:
+        return _from_stream(stream)
+
+    stat = os.stat(filename)
+    key = stat.st_mtime_ns, stat.st_size
+    if filename in _cache and _cache[filename][0] == key:
+        ret = _cache[filename][1]
+    else:
+        try:
+            ret = _from_file(filename)
+        except ValueError as e:
+            ret = e
+        _cache[filename] = key, ret
+
+    if isinstance(ret, ValueError):
+        raise ret
+    return ret
+
+
+def get_sizes(filenames):
+    """Return a dict of filename and (format, width, height).
+
+    If the size is unknown for any reason, the value is ``None``.
+    """
+    sizes = {}
+    for filename in filenames:
+        if filename in sizes:
+            continue
+        try:
+            sizes[filename] = get_size(filename)
+        except (OSError, ValueError):
+            sizes[filename] = None
+    return sizes
+
+
 if __name__ == "__main__":
     import sys
     print(get_size(sys.argv[1]))
@@ -4,6 +4,7 @@
 import logging
 
 from tosixinch import action
+from tosixinch import instrument
 from tosixinch import system
 
 logger = logging.getLogger(__name__)
@@ -15,9 +16,17 @@ class Inspect(action.Extractor):
     def load(self):
         self.doc = self.parse()
 
+    def _count(self):
+        return instrument.count_elements(self.doc)
+
     def process(self):
-        for s in self._site.inspect:
-            system.run_function(self._conf._userdir, 'process', self.doc, s)
+        userdir = self._conf._userdir
+        inspect = self._site.inspect
+        section = self._site.section
+        for func in system.get_functions(userdir, 'process', inspect):
+            name = 'inspect:%s' % func.name
+            with instrument.record(section, name, self._count):
+                func(self.doc)
 
     def run(self):
         self.load()
@@ -25,5 +34,12 @@ class Inspect(action.Extractor):
 
 
 def run(conf, sites):
-    for site in sites:
-        Inspect(conf, site).run()
+    report = conf.general.extract_report
+    if report:
+        instrument.start()
+    try:
+        for site in sites:
+            Inspect(conf, site).run()
+    finally:
+        if report:
+            instrument.stop(report)
@@ -0,0 +1,129 @@
+
+"""Measure extract steps and process functions.
+
+For each step, record wall time, element counts (before and after),
+and peak memory allocation (by ``tracemalloc``),
+aggregated per site section.
+Download ``dprocess`` and ``inspect`` functions are also measured.
+
+It is enabled only when 'extract_report' option is set,
+writing the report to the filename.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+_recorder = None
+
+
+class Stat(object):
+    """Aggregated measurements of a step."""
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.before = 0
+        self.after = 0
+        self.peak = 0
+
+    def add(self, time_, before, after, peak):
+        self.calls += 1
+        self.time += time_
+        self.before += before
+        self.after += after
+        self.peak = max(self.peak, peak)
+
+
+class Recorder(object):
+    """Record measurements, keyed by (section, step)."""
+
+    HEADER = ('section', 'step', 'calls', 'time(s)',
+        'elements(before)', 'elements(after)', 'peak(KiB)')
+
+    def __init__(self):
+        self.stats = {}
+        self._lock = threading.Lock()
+        # download and extract may run in different threads ('pipeline')
+        self._local = threading.local()
+
+    @property
+    def _frames(self):  # [[start memory, peak seen in sub steps]]
+        if not hasattr(self._local, 'frames'):
+            self._local.frames = []
+        return self._local.frames
+
+    def _update_peak(self):
+        # ``tracemalloc`` has only one peak, so pass it on to outer steps
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in self._frames:
+            frame[1] = max(frame[1], peak)
+        tracemalloc.reset_peak()
+        return peak
+
+    @contextlib.contextmanager
+    def record(self, section, step, count=None):
+        before = count() if count else 0
+        self._update_peak()
+        frame = [tracemalloc.get_traced_memory()[0], 0]
+        self._frames.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            time_ = time.perf_counter() - start
+            self._update_peak()
+            self._frames.pop()
+            after = count() if count else 0
+            peak = max(frame[1] - frame[0], 0)
+            with self._lock:
+                stat = self.stats.setdefault((section, step), Stat())
+                stat.add(time_, before, after, peak)
+
+    def format(self):
+        lines = ['\t'.join(self.HEADER)]
+        for (section, step), stat in sorted(
+                self.stats.items(), key=lambda item: item[0][0]):
+            line = (section, step, stat.calls, '%.6f' % stat.time,
+                stat.before, stat.after, stat.peak // 1024)
+            lines.append('\t'.join(str(s) for s in line))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, fname):
+        with open(fname, 'w') as f:
+            f.write(self.format())
+
+
+def count_elements(doc):
+    if doc is None:
+        return 0
+    return sum(1 for _ in doc.iter())
+
+
+def start():
+    global _recorder
+    _recorder = Recorder()
+    tracemalloc.start()
+
+
+def stop(fname):
+    global _recorder
+    recorder, _recorder = _recorder, None
+    tracemalloc.stop()
+    if recorder:
+        recorder.write(fname)
+        logger.info('[report] %s', fname)
+
+
+def record(section, step, count=None):
+    """Return a context manager to measure a step (no-op if not started).
+
+    count: a callable to return the current element count
+    """
+    if _recorder is None:
+        return contextlib.nullcontext()
+    return _recorder.record(section, step, count)
@@ -57,6 +57,7 @@ class Locations(object):
 
         self._iterobj = (Location,)
         self._container = None
+        self._parsed = None  # cache for rsrcs
 
         self._comment = COMMENT_PREFIX
 
@@ -68,7 +69,9 @@ class Locations(object):
 
     @property
     def rsrcs(self):
-        return list(self._parse_rsrcs())
+        if self._parsed is None:
+            self._parsed = list(self._parse_rsrcs())
+        return self._parsed
 
     def __len__(self):
         return len(self.rsrcs)
@@ -87,13 +90,16 @@ class Locations(object):
 class Location(urlmap.Map):
     """Implement concrete url and system path conversion."""
 
-    PREFIX = DOWNLOAD_DIR
-    OVERWRITE = False
+    __slots__ = ('PREFIX', 'OVERWRITE')
 
     HASH_DIR = '_hash'
 
+    def __init__(self, rsrc, input_type=None):
+        super().__init__(rsrc, input_type)
+        self.PREFIX = DOWNLOAD_DIR
+        self.OVERWRITE = False
+
     def _map_name(self, name):
-        name = super()._map_name(name)  # may modify self._hashed
         if self._hashed:
             return self.sep.join(
                 (self.PREFIX, self.HASH_DIR, name))
@@ -144,6 +150,8 @@ class Location(urlmap.Map):
 class Component(urlmap.Ref):
     """Create relative reference for class 'Location'."""
 
+    __slots__ = ()
+
     _CLS = Location
     _INHERIT = ('PREFIX',)
 
@@ -17,17 +17,17 @@ import argparse
 import logging
 import os
 import sys
-import webbrowser
 
 from tosixinch import _set_logger
 from tosixinch import configfetch
-from tosixinch import dispatch
 from tosixinch import settings
-from tosixinch.system import run_cmds
 
 logger = logging.getLogger(__name__)
 
-ENVS = {'userdir': 'TOSIXINCH_USERDIR'}
+ENVS = {
+    'userdir': 'TOSIXINCH_USERDIR',
+    'cachedir': 'TOSIXINCH_CACHEDIR',
+}
 
 DEFAULT_RFILE = 'rsrcs.txt'
 
@@ -79,9 +79,8 @@ def _build_conf_parser(conf):
     return parser
 
 
-def _build_parser(conf):
+def _build_parser(parsers):
     # Build `argparse.ArgumentParser` object.
-    parsers = (_build_cmd_parser(conf), _build_conf_parser(conf))
     parser = argparse.ArgumentParser(
         prog='tosixinch', description=__doc__,
         add_help=False, parents=parsers,
@@ -89,17 +88,34 @@ def _build_parser(conf):
     return parser
 
 
-def _get_parser(conf=None):
-    # Build `argparse.ArgumentParser` arguments.
+def _get_parsers(conf=None):
+    # Build `argparse.ArgumentParser` arguments, only once.
+    # Return the whole parser and the configuration part.
     if conf is None:
         conf = settings.Conf(envs=ENVS)
-    parser = _build_parser(conf)
+    conf_parser = _build_conf_parser(conf)
+    parser = _build_parser((_build_cmd_parser(conf), conf_parser))
+    return conf, parser, conf_parser
+
+
+def _get_parser(conf=None):
+    conf, parser, _ = _get_parsers(conf)
     return conf, parser
 
 
+def _get_confargs(conf_parser, args):
+    # Get configuration part of the parsed arguments, not parsing again
+    # (destinations of the configuration part and the others don't overlap).
+    confargs = argparse.Namespace()
+    for action in conf_parser._actions:
+        if hasattr(args, action.dest):
+            setattr(confargs, action.dest, getattr(args, action.dest))
+    return confargs
+
+
 def _get_conf(args, conf=None):
     # Parse commandline arguments.
-    conf, parser = _get_parser(conf)
+    conf, parser, conf_parser = _get_parsers(conf)
 
     if not args:
         usage(parser)
@@ -115,8 +131,7 @@ def _get_conf(args, conf=None):
     else:
         _set_logger('info')
 
-    conf_parser = _build_conf_parser(conf)
-    confargs, _ = conf_parser.parse_known_args(_args)
+    confargs = _get_confargs(conf_parser, args)
     conf._appconf.set_arguments(confargs)
     conf.user_init(args)
 
@@ -168,6 +183,7 @@ def _main(args=sys.argv[1:], conf=None):
         inspect.run(conf, conf.sites)
         return
 
+    from tosixinch import dispatch
     dispatch.main_dispatch(conf, args)
 
     return conf
@@ -198,8 +214,10 @@ def open_browser(conf):
     url = site.slash_efile
     cmd = conf.general.browsercmd
     if cmd:
+        from tosixinch.system import run_cmds
         returncode = run_cmds([cmd], conf, site)
     else:
+        import webbrowser
         ret = webbrowser.open(url)
         # ret is True or False
         returncode = int(not ret)
@@ -0,0 +1,152 @@
+
+"""Concatenate PDF files, keeping bookmarks.
+
+It uses ``pypdf`` library (optional).
+
+Converters make one PDF from one process,
+so to convert in parallel (or incrementally),
+we make some PDF files first, and concatenate them here.
+"""
+
+import logging
+import os
+import urllib.parse
+import urllib.request
+
+from tosixinch import _ImportError
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = _ImportError('pypdf')
+
+logger = logging.getLogger(__name__)
+
+
+def _get_dests(reader):
+    """Return a dict of named destinations and (page index, top)."""
+    dests = {}
+    for name, dest in reader.named_destinations.items():
+        try:
+            num = reader.get_destination_page_number(dest)
+        except (KeyError, ValueError):
+            continue
+        if num >= 0:
+            dests[name] = num, dest.get('/Top')
+    return dests
+
+
+class DocumentMerger(object):
+    """Concatenate PDF files converted from each html.
+
+    Links to the other htmls (in the PDFs, they are URI links)
+    and links to named destinations (they may conflict between PDFs)
+    are rewritten to explicit page destinations.
+
+    If a html is merged from some htmls (``children``),
+    links to a child go to its destination by ``path2id``
+    (the id of the merged body),
+    or to the first page of the html if it is the first child.
+    """
+
+    def __init__(self, documents, children=None, path2id=None):
+        self.documents = documents  # [(pdf file name, html file name)]
+        self._dests = {}  # {html absolute path: (first page, dests)}
+        # {child absolute path: (html absolute path, id, is first child)}
+        self._children = {}
+        for html, paths in (children or {}).items():
+            for i, path in enumerate(paths):
+                id_ = path2id(path) if path2id else None
+                self._children[os.path.abspath(path)] = (
+                    os.path.abspath(html), id_, i == 0)
+
+    def merge(self, pdfname):
+        writer = pypdf.PdfWriter()
+        ranges = []
+        for fname, html in self.documents:
+            reader = pypdf.PdfReader(fname)
+            start = len(writer.pages)
+            dests = {name: (start + num, top)
+                for name, (num, top) in _get_dests(reader).items()}
+            self._dests[os.path.abspath(html)] = start, dests
+            writer.append(reader, import_outline=True)
+            ranges.append((start, len(writer.pages), html))
+
+        for start, end, html in ranges:
+            for page in writer.pages[start:end]:
+                self._fix_links(writer, page, html)
+
+        with open(pdfname, 'wb') as f:
+            writer.write(f)
+        writer.close()
+        logger.debug('[pdfmerge] %d files to %r', len(ranges), pdfname)
+
+    def _fix_links(self, writer, page, html):
+        NameObject = pypdf.generic.NameObject
+        for annot in page.get('/Annots') or []:
+            annot = annot.get_object()
+            if annot.get('/Subtype') != '/Link':
+                continue
+            target = self._get_target(annot, html)
+            if target is None:
+                continue
+            num, top = target
+            null = pypdf.generic.NullObject()
+            if top is not None:
+                top = pypdf.generic.FloatObject(top)
+            dest = pypdf.generic.ArrayObject([
+                writer.pages[num].indirect_reference, NameObject('/XYZ'),
+                null, null if top is None else top, null])
+            annot.pop('/Dest', None)
+            annot[NameObject('/A')] = pypdf.generic.DictionaryObject({
+                NameObject('/S'): NameObject('/GoTo'),
+                NameObject('/D'): dest,
+            })
+
+    def _get_target(self, annot, html):
+        """Return (page index, top) the link should go, or ``None``."""
+        action = annot.get('/A')
+        action = action.get_object() if action else {}
+        if '/Dest' in annot:
+            return self._get_named_target(html, annot['/Dest'])
+        if action.get('/S') == '/GoTo':
+            return self._get_named_target(html, action.get('/D'))
+        if action.get('/S') == '/URI':
+            return self._get_uri_target(html, action.get('/URI'))
+
+    def _get_named_target(self, html, name):
+        if isinstance(name, bytes):
+            name = name.decode('utf-8', 'replace')
+        if not isinstance(name, str):  # explicit destination (array)
+            return None
+        _, dests = self._dests[os.path.abspath(html)]
+        return dests.get(name) or dests.get(name.lstrip('/'))
+
+    def _get_uri_target(self, html, uri):
+        if not isinstance(uri, str):
+            uri = uri.decode('utf-8', 'replace')
+        url, fragment = urllib.parse.urldefrag(uri)
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme == 'file':
+            path = urllib.request.url2pathname(parts.path)
+        elif parts.scheme or parts.netloc:
+            return None
+        elif parts.path:
+            path = os.path.join(os.path.dirname(os.path.abspath(html)),
+                urllib.parse.unquote(parts.path))
+        else:
+            path = html
+
+        path = os.path.abspath(path)
+        html, id_, first = self._children.get(path, (path, None, True))
+        start, dests = self._dests.get(html, (None, None))
+        if start is None:
+            return None
+        fragment = urllib.parse.unquote(fragment)
+        if fragment and fragment in dests:
+            return dests[fragment]
+        if id_ in dests:
+            return dests[id_]
+        if first:
+            return start, None
+        return None
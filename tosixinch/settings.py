@@ -11,9 +11,11 @@ we try to keep the word ``config`` for `ConfigParser` object,
 """
 
 import argparse
+import configparser
 import fnmatch
 import glob
-import importlib.resources
+import heapq
+import json
 import logging
 import os
 import re
@@ -22,16 +24,17 @@ import urllib.parse
 
 from tosixinch import cached_property
 
-from tosixinch import action
 from tosixinch import configfetch
 from tosixinch import location
-
-from tosixinch.zconfigparser import ZConfigParser
+from tosixinch import zconfigparser
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_PDFNAME = 'no-rsrcs.pdf'
 
+# Increment when the format of config snapshots is changed.
+SNAPSHOT_VERSION = 1
+
 # https://github.com/sindresorhus/binary-extensions
 BINARY_EXTENSIONS = """
     3dm 3ds 3g2 3gp 7z a aac adp ai aif aiff alz ape apk appimage ar arj asf
@@ -158,47 +161,113 @@ def _getpdfname(rsrc, section, length=1):
     return name + '.pdf'
 
 
-# TODO: refactor
-# build a reverse dictionary with match rsrc keys, for faster lookup.
-def _checkmacth(rsrc, siteconfig):
-    def checkloc(rsrc, matches):
-        rsrc = rsrc.lower()
-        matches = [
-            m for m in matches if fnmatch.fnmatch(rsrc, m.lower())]
-
-        if len(matches) == 0:
-            matched = 'http://tosixinch.example.com'  # [scriptdefault]
-        elif len(matches) == 1:
-            matched = matches[0]
-        else:
-            matched = sorted(matches, key=checkslash)[-1]
-        return matched
+DEFAULT_MATCH = 'http://tosixinch.example.com'  # [scriptdefault]
+
+_WILDCARD_RE = re.compile(r'[*?[]')
+
 
-    def checkslash(rsrc):
-        upath = urllib.parse.urlsplit(rsrc)[2]
-        num = len(upath.split('/'))
-        if upath == '':
-            num = -1
-        return num
+def _get_host_key(url):
+    """Return 'scheme://host' part (lowercased), or ``None``."""
+    scheme, sep, rest = url.lower().partition('://')
+    if not sep:
+        return None
+    return scheme + sep + rest.split('/', 1)[0]
 
-    t = [[sec, siteconfig[sec]['match']] for sec in siteconfig.sections()]
-    matched = checkloc(rsrc, [match for sec, match in t])
-    for sec, match in t:
-        if match == matched:
-            return sec
+
+def _checkslash(rsrc):
+    upath = urllib.parse.urlsplit(rsrc)[2]
+    num = len(upath.split('/'))
+    if upath == '':
+        num = -1
+    return num
+
+
+class SiteMatcher(object):
+    """Find the site section for rsrcs, by ``match`` glob patterns.
+
+    Patterns are compiled beforehand, and grouped by 'scheme://host',
+    so that only the patterns for the rsrc host (and patterns with
+    wildcards in host, or for local paths) are tried.
+
+    When multiple patterns match,
+    the one with the most path segments wins (the last one if tie).
+    """
+
+    def __init__(self, items):
+        self._sections = {}  # {match: the first section}
+        self._hosts = {}  # {host key: [pattern]}
+        self._generic = []  # [pattern]
+
+        for i, (section, match) in enumerate(items):
+            self._sections.setdefault(match, section)
+            regex = re.compile(fnmatch.translate(match.lower()))
+            pattern = i, _checkslash(match), regex.match, match
+
+            host = _get_host_key(match)
+            if host is None or _WILDCARD_RE.search(host):
+                self._generic.append(pattern)
+            else:
+                self._hosts.setdefault(host, []).append(pattern)
+
+    def _get_candidates(self, rsrc):
+        patterns = self._hosts.get(_get_host_key(rsrc))
+        if not patterns:
+            return self._generic
+        if not self._generic:
+            return patterns
+        # in the original order
+        return heapq.merge(patterns, self._generic)
+
+    def match(self, rsrc):
+        """Return section name, or ``None``."""
+        lower = rsrc.lower()
+        best = None
+        for pattern in self._get_candidates(lower):
+            if pattern[2](lower):
+                if best is None or pattern[1] >= best[1]:
+                    best = pattern
+
+        matched = best[3] if best else DEFAULT_MATCH
+        return self._sections.get(matched)
+
+
+def _get_sitematcher(siteconfig):
+    # rebuilt when config data (e.g. 'match' values) are changed
+    changes, matcher = getattr(siteconfig, '_sitematcher', (None, None))
+    if changes != siteconfig.changes:
+        items = [(sec, siteconfig[sec]['match'])
+            for sec in siteconfig.sections()]
+        matcher = SiteMatcher(items)
+        siteconfig._sitematcher = siteconfig.changes, matcher
+    return matcher
+
+
+def _checkmacth(rsrc, siteconfig):
+    return _get_sitematcher(siteconfig).match(rsrc)
 
 
 def _get_configdir():
-    path = importlib.resources.files('tosixinch')
+    # not 'importlib.resources', which is slow to import
+    path = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(path, 'data')
 
 
-def _get_configs(fmts, args, envs):
-    configdir = _get_configdir()
-
+def _get_config_files(configdir):
     default_appconfig = os.path.join(configdir, 'fini', '_tosixinch.fini')
     default_siteconfig = os.path.join(configdir, 'fini', '_site.fini')
     sample_siteconfig = os.path.join(configdir, 'site.sample.ini')
+    return default_appconfig, default_siteconfig, sample_siteconfig
+
+
+def _get_configs(fmts, args, envs, cachedir=None):
+    configdir = _get_configdir()
+    fnames = _get_config_files(configdir)
+    default_appconfig, default_siteconfig, sample_siteconfig = fnames
+
+    snapshot = Snapshot(cachedir, 'config', fnames)
+    appconf, siteconf = _new_configs(fmts, args, envs)
+    if snapshot.load(appconf, siteconf):
+        return configdir, appconf, siteconf
 
     appconf, siteconf = _read_configs(
         default_appconfig, default_siteconfig, fmts, args, envs)
@@ -206,9 +275,21 @@ def _get_configs(fmts, args, envs):
     with open(sample_siteconfig) as f:
         siteconf.read_file(f)
 
+    snapshot.save(appconf, siteconf)
     return configdir, appconf, siteconf
 
 
+def _new_configs(fmts, args, envs, option_builder=None):
+    # Note ``configfetch.fetch`` doesn't pass ``ConfigParser`` arguments,
+    # so parsers are built with the default ones here too.
+    kwargs = {'fmts': fmts, 'args': args, 'envs': envs, 'Func': Func}
+    if option_builder:
+        kwargs['option_builder'] = option_builder
+    appconf = ConfigFetch(**kwargs)
+    siteconf = ConfigFetch(parser=ZConfigParser, **kwargs)
+    return appconf, siteconf
+
+
 def _read_configs(appconfig, siteconfig, fmts, args, envs):
     """Read appconfig and siteconfig files.
 
@@ -234,14 +315,10 @@ def _read_configs(appconfig, siteconfig, fmts, args, envs):
     with open(appconfig) as f:
         cstring = ''.join(_iterate(f))
 
-    appconf = configfetch.fetch(
-        cstring, fmts=fmts, args=args, envs=envs, Func=Func,
-        option_builder=builder, empty_lines_in_values=False)
-
-    siteconf = configfetch.fetch(
-        siteconfig, parser=ZConfigParser,
-        fmts=fmts, args=args, envs=envs, Func=Func,
-        option_builder=builder, empty_lines_in_values=False)
+    appconf, siteconf = _new_configs(fmts, args, envs, builder)
+    appconf.fetch(cstring)
+    with open(siteconfig) as f:
+        siteconf.fetch(f)
 
     for option in common_options:
         siteconf._config['DEFAULT'][option] = ''
@@ -253,11 +330,12 @@ def _read_configs(appconfig, siteconfig, fmts, args, envs):
     return appconf, siteconf
 
 
-def _get_user_configs(args, envs, appconf, siteconf):
+def _get_userdir(args, envs):
     if args.nouserdir:
         logger.debug('[userdir] (none)')
         return
 
+    userdir = None
     if args.userdir:
         userdir = args.userdir
     elif envs.get('userdir'):
@@ -275,32 +353,38 @@ def _get_user_configs(args, envs, appconf, siteconf):
 
     if userdir:
         logger.debug("[userdir] '%s'", userdir)
-        appconfigs = sorted(glob.glob(userdir + os.sep + 'tosixinch*.ini'))
-        siteconfigs = sorted(glob.glob(userdir + os.sep + 'site*.ini'))
-        for appconfig in appconfigs:
-            logger.debug('reading user application config: %r', appconfig)
-            with open(appconfig) as f:
-                appconf.read_file(f)
-
-        for siteconfig in siteconfigs:
-            logger.debug('reading user site config: %r', siteconfig)
-            with open(siteconfig) as f:
-                siteconf.read_file(f)
     else:
         logger.debug('[userdir] (none)')
-
     return userdir
 
 
-def _read_cur_config(appconf, siteconf):  # read from current directory
+def _get_user_configs(userdir):
+    """Return user application and site config file names.
+
+    They include config files in current directory, at the last.
+    """
+    appconfigs, siteconfigs = [], []
+    if userdir:
+        appconfigs = sorted(glob.glob(userdir + os.sep + 'tosixinch*.ini'))
+        siteconfigs = sorted(glob.glob(userdir + os.sep + 'site*.ini'))
+
+    # read from current directory
     if os.path.isfile('tosixinch.ini'):
-        logger.debug('reading application config from current directory')
-        with open('tosixinch.ini') as f:
+        appconfigs.append('tosixinch.ini')
+    if os.path.isfile('site.ini'):
+        siteconfigs.append('site.ini')
+    return appconfigs, siteconfigs
+
+
+def _read_user_configs(appconfigs, siteconfigs, appconf, siteconf):
+    for appconfig in appconfigs:
+        logger.debug('reading user application config: %r', appconfig)
+        with open(appconfig) as f:
             appconf.read_file(f)
 
-    if os.path.isfile('site.ini'):
-        logger.debug('reading site config from current directory')
-        with open('site.ini') as f:
+    for siteconfig in siteconfigs:
+        logger.debug('reading user site config: %r', siteconfig)
+        with open(siteconfig) as f:
             siteconf.read_file(f)
 
 
@@ -331,6 +415,107 @@ def _check_platform_dirs():
             return path
 
 
+def _get_cachedir(envs):
+    """Return a directory for config snapshots, or ``None`` (not to cache).
+
+    Snapshots are used only when ``envs`` has 'cachedir' key,
+    and the environment variable is set (and not blank).
+    """
+    if not envs.get('cachedir'):
+        return None
+
+    cachedir = os.environ.get(envs['cachedir'])
+    if not cachedir:
+        return None
+    return os.path.expanduser(cachedir)
+
+
+class Snapshot(object):
+    """Keep parsed config data in a cache file (JSON).
+
+    It is valid while the config files (and the parsing modules)
+    are not changed, compared by paths, modification times and sizes.
+    It keeps only plain data (metadata and raw option values).
+
+    :param cachedir: directory to write the file (``None`` to do nothing)
+    :param name: file basename
+    :param fnames: config file names
+    """
+
+    def __init__(self, cachedir, name, fnames):
+        self.fname = None
+        if cachedir:
+            self.fname = os.path.join(cachedir, name + '.json')
+            self.key = self._get_key(fnames)
+
+    def _get_key(self, fnames):
+        # a list of lists, to compare with the one loaded from JSON
+        modules = (__file__, configfetch.__file__, zconfigparser.__file__)
+        key = [[SNAPSHOT_VERSION]]
+        for fname in tuple(fnames) + modules:
+            stat = os.stat(fname)
+            key.append(
+                [os.path.abspath(fname), stat.st_mtime_ns, stat.st_size])
+        return key
+
+    def _get_state(self, conf, ctx=True):
+        config = conf._config
+        sections = {config.default_section: dict(config.defaults())}
+        for name in config.sections():
+            # not ``config.items``, which includes defaults (and parents)
+            sections[name] = dict(config._sections[name])
+        return {'ctx': conf._ctx if ctx else None, 'sections': sections}
+
+    def _set_state(self, conf, state):
+        ctx = state['ctx']
+        if ctx is not None:
+            # ``argparse`` checks ``SUPPRESS`` by identity.
+            for meta in ctx.values():
+                args = meta.get('argparse') or {}
+                for key, value in args.items():
+                    if value == argparse.SUPPRESS:
+                        args[key] = argparse.SUPPRESS
+            conf._ctx.update(ctx)
+        conf.read_dict(state['sections'])
+
+    def load(self, *confs):
+        """Restore ``ConfigFetch`` objects, return ``True`` if succeeded.
+
+        If it fails in the middle, the objects may be partly updated.
+        """
+        if self.fname is None or not os.path.isfile(self.fname):
+            return False
+        try:
+            with open(self.fname, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['key'] != self.key:
+                return False
+            for conf, state in zip(confs, data['states'], strict=True):
+                self._set_state(conf, state)
+        except (OSError, ValueError, KeyError, TypeError,
+                configparser.Error) as e:  # broken or incompatible file
+            logger.debug('[snapshot] failed to load %r (%s)', self.fname, e)
+            return False
+        logger.debug('[snapshot] loaded %r', self.fname)
+        return True
+
+    def save(self, *confs, ctx=True):
+        """Write ``ConfigFetch`` objects' data (and metadata if ``ctx``)."""
+        if self.fname is None:
+            return
+        states = [self._get_state(conf, ctx) for conf in confs]
+        tmpname = '%s.%d.tmp' % (self.fname, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.fname), exist_ok=True)
+            with open(tmpname, 'w', encoding='utf-8') as f:
+                json.dump({'key': self.key, 'states': states}, f)
+            os.replace(tmpname, self.fname)
+        except OSError as e:
+            logger.debug('[snapshot] failed to save %r (%s)', self.fname, e)
+            return
+        logger.debug('[snapshot] saved %r', self.fname)
+
+
 class Func(configfetch.Func):
     """Customize configfetch.Func for this application."""
 
@@ -341,6 +526,157 @@ class Func(configfetch.Func):
             reversed(values), BINARY_EXTENSIONS)
 
 
+def _copy(value):
+    # Cached values are shared, so return copies of mutable ones.
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+class _Changes(object):
+    """Count changes of config data (``changes``), to validate caches."""
+
+    def __init__(self, *args, **kwargs):
+        self.changes = 0
+        super().__init__(*args, **kwargs)
+
+    def _changed(self):
+        self.changes += 1
+
+    def _read(self, fp, fpname):
+        self._changed()
+        super()._read(fp, fpname)
+
+    def add_section(self, section):
+        self._changed()
+        super().add_section(section)
+
+    def set(self, section, option, value=None):
+        self._changed()
+        super().set(section, option, value)
+
+    def remove_option(self, section, option):
+        self._changed()
+        return super().remove_option(section, option)
+
+    def remove_section(self, section):
+        self._changed()
+        return super().remove_section(section)
+
+
+class ConfigParser(_Changes, configparser.ConfigParser):
+    """Customize configparser.ConfigParser for this application."""
+
+
+class ZConfigParser(_Changes, zconfigparser.ZConfigParser):
+    """Customize zconfigparser.ZConfigParser for this application.
+
+    Option values of each zsection are cached
+    as one flattened dictionary (until config data are changed),
+    since inheritance chains are resolved for every option access.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._flattened = {}  # {section: dict of all inherited options}
+        super().__init__(*args, **kwargs)
+
+    def _changed(self):
+        self._flattened.clear()
+        super()._changed()
+
+    def _unify_values(self, section, vars):
+        if vars:
+            return super()._unify_values(section, vars)
+        try:
+            return self._flattened[section]
+        except KeyError:
+            pass
+        # ``ChainMap`` of the section, its parents and defaults
+        chainmap = super()._unify_values(section, vars)
+        flattened = self._flattened[section] = dict(chainmap)
+        return flattened
+
+
+class ConfigFetch(configfetch.ConfigFetch):
+    """Customize configfetch.ConfigFetch for this application.
+
+    Converted values are cached per section and option,
+    until config data (``changes`` of the parser) or ``args`` are changed.
+    Environment variables are read only once.
+    """
+
+    def __init__(self, *, parser=ConfigParser, **kwargs):
+        self._values = {}  # {(section, option): converted value}
+        self._version = None
+        self._generation = 0  # incremented when the values are cleared
+        super().__init__(parser=parser, **kwargs)
+
+    # ``fetch`` sets them as shortcuts, but snapshots skip ``fetch``.
+    def read(self, *args, **kwargs):
+        return self._config.read(*args, **kwargs)
+
+    def read_file(self, *args, **kwargs):
+        return self._config.read_file(*args, **kwargs)
+
+    def read_string(self, *args, **kwargs):
+        return self._config.read_string(*args, **kwargs)
+
+    def read_dict(self, *args, **kwargs):
+        return self._config.read_dict(*args, **kwargs)
+
+    def _check_values(self):
+        version = self._config.changes, self._args
+        if (self._version is None or version[0] != self._version[0]
+                or version[1] is not self._version[1]):
+            self._values.clear()
+            self._version = version
+            self._generation += 1
+
+    def __getattr__(self, section):
+        if section not in self._cache:
+            s = SectionProxy(
+                self, section, self._ctx, self._fmts, self._Func)
+            self._cache[section] = s
+        return self._cache[section]
+
+
+class SectionProxy(configfetch.SectionProxy):
+    """Customize configfetch.SectionProxy, to cache values."""
+
+    def __getattr__(self, option):
+        conf = self._conf
+        conf._check_values()
+        key = self.name, option
+        try:
+            value = conf._values[key]
+        except KeyError:
+            value = conf._values[key] = super().__getattr__(option)
+        return _copy(value)
+
+
+class Double(configfetch.Double):
+    """Customize configfetch.Double, to cache values."""
+
+    def __init__(self, sec, parent_sec):
+        super().__init__(sec, parent_sec)
+        self._values = {}
+        self._generations = None
+
+    def __getattr__(self, option):
+        confs = self.sec._conf, self.parent_sec._conf
+        for conf in confs:
+            conf._check_values()
+        generations = tuple(conf._generation for conf in confs)
+        if generations != self._generations:
+            self._values.clear()
+            self._generations = generations
+        try:
+            value = self._values[option]
+        except KeyError:
+            value = self._values[option] = super().__getattr__(option)
+        return _copy(value)
+
+
 class Sites(location.Locations):
     """An object for ``Site`` iteration."""
 
@@ -376,11 +712,16 @@ class Sites(location.Locations):
 class Site(location.Location):
     """Settings for each rsrc."""
 
+    # 'ftype' is set by callers, other options are found by '__getattr__'
+    __slots__ = ('_conf', '_siteconf', '_config', 'section',
+        'general', 'style', 'converter', 'ftype', '_text')
+
     def __init__(self, rsrc, conf, siteconf, input_type=None):
         super().__init__(rsrc, input_type)
         self._conf = conf
         self._siteconf = siteconf
         self._config = siteconf._config
+        self._text = None  # cache for 'text'
 
         self.PREFIX = conf.general.download_dir  # may be blank string ''
         self.OVERWRITE = conf.general.overwrite_html
@@ -388,11 +729,11 @@ class Site(location.Location):
         self.section = _checkmacth(self.rsrc, self._config)
 
         _sec = self._get_self()
-        self.general = configfetch.Double(_sec, self._conf.general)
-        self.style = configfetch.Double(_sec, self._conf.style)
+        self.general = Double(_sec, self._conf.general)
+        self.style = Double(_sec, self._conf.style)
 
         _conv = getattr(self._conf, self._conf.general.converter)
-        self.converter = configfetch.Double(_sec, _conv)
+        self.converter = Double(_sec, _conv)
 
     def _get_self(self):
         return self._siteconf.get(self.section)
@@ -415,11 +756,15 @@ class Site(location.Location):
             num = max(len(parts) - abs(num), 0)
         return sep.join(parts[num:])
 
-    @cached_property
+    @property
     def text(self):
-        codings = self.general.encoding
-        errors = self.general.encoding_errors
-        return action.read(self.dfile, codings=codings, errors=errors)
+        if self._text is None:
+            codings = self.general.encoding
+            errors = self.general.encoding_errors
+            from tosixinch import action  # lxml is imported lazily
+            self._text = action.read(
+                self.dfile, codings=codings, errors=errors)
+        return self._text
 
 
 class Conf(object):
@@ -446,7 +791,8 @@ class Conf(object):
         fmts = fmts or {}
         args = args or argparse.Namespace()
         envs = envs or {}
-        _confs = _get_configs(fmts, args, envs)
+        self._cachedir = _get_cachedir(envs)
+        _confs = _get_configs(fmts, args, envs, self._cachedir)
         self._configdir, self._appconf, self._siteconf = _confs
 
         self._appdir = os.path.dirname(self._configdir)
@@ -465,8 +811,7 @@ class Conf(object):
             self.sites_init(rsrcs, rfile)
 
     def user_init(self, args):
-        self._userdir = _get_user_configs(
-            args, self._appconf._envs, self._appconf, self._siteconf)
+        self._userdir = _get_userdir(args, self._appconf._envs)
 
         if self._userdir:
             self._user_scriptdir = os.path.join(self._userdir, self.SCRIPTDIR)
@@ -475,7 +820,17 @@ class Conf(object):
             self._user_scriptdir = None
             self._user_cssdir = None
 
-        _read_cur_config(self._appconf, self._siteconf)
+        appconfigs, siteconfigs = _get_user_configs(self._userdir)
+        fnames = (_get_config_files(self._configdir)
+            + tuple(appconfigs) + tuple(siteconfigs))
+        snapshot = Snapshot(self._cachedir, 'user_config', fnames)
+        if snapshot.load(self._appconf, self._siteconf):
+            return
+
+        _read_user_configs(
+            appconfigs, siteconfigs, self._appconf, self._siteconf)
+        # Metadata (``_ctx``) is not changed by user configs.
+        snapshot.save(self._appconf, self._siteconf, ctx=False)
 
     def sites_init(self, rsrcs=None, rfile=None):
         sites = Sites(rsrcs, rfile, self._appconf, self._siteconf)
@@ -4,6 +4,7 @@
 import http.cookiejar
 import gzip
 import importlib
+import json
 import logging
 import os
 import shlex
@@ -247,6 +248,37 @@ class DownloadWriter(Writer):
         os.replace(part, self.get_filename(fname))
 
 
+class Manifest(object):
+    """Record checksums of inputs per output file, in a json file.
+
+    To skip the same processing next time.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.fname) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def check(self, path, key):
+        """Return ``True`` if path exists and was made from the same key."""
+        if key is None or not os.path.isfile(path):
+            return False
+        return self.data.get(os.path.abspath(path)) == key
+
+    def record(self, path, key):
+        self.data[os.path.abspath(path)] = key
+
+    def save(self):
+        text = json.dumps(self.data, indent=2, sort_keys=True)
+        download_write(self.fname, text)
+
+
 def read(fname, text=None, codings=None, errors='strict', length=None):
     return Reader(fname, text, codings, errors, length).read()
 
@@ -374,10 +406,10 @@ def _add_files_env(site):
 
 # python import ----------------------------------
 
-_PROCESS_FUNCTIONS_REGISTERED = False
-
 _mod_cache = {}
 _obj_cache = {}
+_registry_cache = {}
+_func_cache = {}
 
 
 def _register_userdir(userdir):
@@ -447,11 +479,11 @@ def _parse_func_string(func_string):
 
 def _get_all_modules(userdir, package_name):
     if userdir:
-        names = os.listdir(os.path.join(userdir, package_name))
+        d = os.path.join(userdir, package_name)
     else:
         d = os.path.dirname(__file__)
         d = os.path.join(d, package_name)
-        names = os.listdir(d) if os.path.isdir(d) else []
+    names = sorted(os.listdir(d)) if os.path.isdir(d) else []
     for name in names:
         if name.startswith('__'):
             continue
@@ -462,44 +494,89 @@ def _get_all_modules(userdir, package_name):
             yield modname, mod
 
 
-def _register_all_functions(userdir, package_name):
-    global _PROCESS_FUNCTIONS_REGISTERED
-    if _PROCESS_FUNCTIONS_REGISTERED:
-        return
+def _build_registry(userdir, package_name):
+    """Map function names to ([(modname, user function), ...], function).
 
-    for u in (userdir, None):
+    The latter is the first found function in application directory.
+    """
+    registry = {}
+    userdirs = (userdir, None) if userdir else (None,)
+    for u in userdirs:
         for modname, mod in _get_all_modules(u, package_name):
             for objname, obj in mod.__dict__.items():
-                if isinstance(obj, types.FunctionType):
-                    key = (userdir, package_name, modname, objname)
-                    _obj_cache[key] = obj
+                if not isinstance(obj, types.FunctionType):
+                    continue
+                user_funcs, func = registry.get(objname, ([], None))
+                if u:
+                    user_funcs.append((modname, obj))
+                elif func is None:
+                    func = obj
+                registry[objname] = user_funcs, func
+    return registry
+
 
-    _PROCESS_FUNCTIONS_REGISTERED = True
+def _get_registry(userdir, package_name):
+    key = (userdir, package_name)
+    if key not in _registry_cache:
+        _registry_cache[key] = _build_registry(userdir, package_name)
+    return _registry_cache[key]
 
 
-def _search_function(package_name_, funcname):
-    user_funcs = []
-    program_funcs = []
-    for key in _obj_cache:
-        userdir, package_name, modname, objname = key
-        if package_name == package_name_:
-            if funcname == objname:
-                if userdir:
-                    user_funcs.append(key)
-                else:
-                    program_funcs.append(key)
+def _search_function(userdir, package_name, funcname):
+    registry = _get_registry(userdir, package_name)
+    user_funcs, func = registry.get(funcname, ([], None))
 
     if len(user_funcs) > 1:
-        msg = ['%s.%s' % (modname, objname)
-            for userdir, package_name, modname, objname in user_funcs]
+        msg = ['%s.%s' % (modname, funcname) for modname, obj in user_funcs]
         msg = 'duplicate function names: ' + ', '.join(msg)
         raise ValueError(msg)
 
     if user_funcs:
-        return _obj_cache[user_funcs[0]]
-    if program_funcs:
-        return _obj_cache[program_funcs[0]]
-    return None
+        return user_funcs[0][1]
+    return func
+
+
+class Function(object):
+    """Function with other arguments bound, to call with 'element'."""
+
+    def __init__(self, func_string, func, args):
+        self.name = func_string
+        self.func = func
+        self.args = args
+
+    def __call__(self, element):
+        return self.func(element, *self.args)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.name)
+
+
+def get_function(userdir, package_name, func_string):
+    """Search a function in modules in a directory, and return ``Function``.
+
+    See ``run_function`` for the details.
+    """
+    key = (userdir, package_name, func_string)
+    if key in _func_cache:
+        return _func_cache[key]
+
+    modname, funcname, args = _parse_func_string(func_string)
+    if modname is None:
+        func = _search_function(userdir, package_name, funcname)
+        msg = 'function (%r) is not found' % funcname
+    else:
+        func = _get_object(userdir, package_name, modname, funcname)
+        msg = "function ('%s.%s') is not found" % (modname, funcname)
+
+    if func is None:
+        raise AttributeError(msg)
+    func = _func_cache[key] = Function(func_string, func, args)
+    return func
+
+
+def get_functions(userdir, package_name, func_strings):
+    return [get_function(userdir, package_name, func_string)
+        for func_string in func_strings]
 
 
 def run_function(userdir, package_name, element, func_string):
@@ -518,15 +595,4 @@ def run_function(userdir, package_name, element, func_string):
     If it includes no dot,
     the program searches the name in all modules.
     """
-    modname, funcname, args = _parse_func_string(func_string)
-    if modname is None:
-        _register_all_functions(userdir, package_name)
-        func = _search_function(package_name, funcname)
-        msg = 'function (%r) is not found' % funcname
-    else:
-        func = _get_object(userdir, package_name, modname, funcname)
-        msg = "function ('%s.%s') is not found" % (modname, funcname)
-
-    if func is None:
-        raise AttributeError(msg)
-    return func(element, *args)
+    return get_function(userdir, package_name, func_string)(element)
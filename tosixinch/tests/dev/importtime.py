@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""Print startup import times of some commands (``python -X importtime``).
+
+For commands not doing actual jobs (``--version``, ``--check`` etc.),
+heavy modules (lxml and the pipeline modules) should not be imported.
+
+$ python tosixinch/tests/dev/importtime.py [-n NUM]
+"""
+
+import argparse
+import subprocess
+import sys
+
+RSRC = 'https://en.wikipedia.org/wiki/Xpath'
+
+COMMANDS = [
+    ['--version'],
+    ['--nouserdir', '-i', RSRC, '--appcheck'],
+    ['--nouserdir', '-i', RSRC, '--check'],
+    ['--nouserdir', '-i', RSRC, '--printout', '1'],
+]
+
+HEAVY_MODULES = ('lxml', 'tosixinch.action', 'tosixinch.dispatch')
+
+
+def parse(stderr):
+    """Return a list of (module name, cumulative import time (us), top)."""
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():  # header line
+            continue
+        top = not name[1:].startswith(' ')  # not imported by other modules
+        times.append((name.strip(), int(cumulative), top))
+    return times
+
+
+def run(args):
+    cmd = [sys.executable, '-X', 'importtime', '-m', 'tosixinch.main']
+    ret = subprocess.run(cmd + args,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return parse(ret.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--num', type=int, default=10,
+        help='number of the slowest modules to print (default: 10)')
+    args = parser.parse_args()
+
+    for command in COMMANDS:
+        times = run(command)
+        total = sum(t for name, t, top in times if top)
+        print('%s: %.1f ms' % (' '.join(command), total / 1000))
+        heavy = [name for name, _, _ in times
+            if name.startswith(HEAVY_MODULES)]
+        if heavy:
+            print('    (heavy modules: %s)' % ', '.join(sorted(heavy)))
+        slowest = sorted(times, key=lambda x: x[1], reverse=True)
+        for name, t, _ in slowest[:args.num]:
+            print('    %8.1f ms  %s' % (t / 1000, name))
+
+
+if __name__ == '__main__':
+    main()
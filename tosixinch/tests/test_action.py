@@ -43,3 +43,19 @@ def test__set_finlename():
     assert get('bbb/bb') == []
     assert get('ccc/cc') == ['ccc/cc']
     assert get('ddd/dd') == []
+
+
+def test_css_reference():
+    class Extractor(action.Extractor):
+        stylesheets = ['a.css', 'b&b.css']
+
+        def __init__(self):
+            pass
+
+    extractor = Extractor()
+    refs = list(extractor.get_css_reference())
+    doc = action.lxml_html.document_fromstring('<html><head></head></html>')
+    extractor._add_css_elememnt(doc)
+    els = doc.head.findall('link')
+    assert refs == [action.lxml_html.tostring(el, encoding='unicode')
+        for el in els]
@@ -58,3 +58,40 @@ def test_stylematcher():
 
     css = matcher.run_matches(data)
     assert css == expected2
+
+
+def test_parse_declaration():
+    def parse_declaration(declarations):
+        # the previous regex version
+        for dec in declarations.split(';'):
+            if not dec.strip():
+                continue
+            m = clean.RE_CSS_DECLARATION.match(dec)
+            if m:
+                prop, valstr = m.groups()
+                prop = prop.lower()
+                valstr = valstr.replace(' !important', '').strip()
+                yield prop, valstr
+
+    data = [
+        'color: red',
+        ' COLOR :red !important ;;',
+        'font: bold\n; margin:\n 0 auto\n',
+        'margin: 0\n auto; padding: 0',
+        'a b: c; :d; e:; f',
+        'content: "a:b"; background: url(http://example.com/a.png)',
+        'font-family:　"x"　',
+    ]
+    matcher = clean.StyleMatcher()
+    for d in data:
+        assert list(matcher.parse_declaration(d)) == list(parse_declaration(d))
+
+
+def test_stylematcher_memo():
+    matcher = clean.get_stylematcher(['font-weight: bold'])
+    assert clean.get_stylematcher(['font-weight: bold']) is matcher
+
+    data = 'font-weight: bold; color: red'
+    assert matcher.run_matches(data) == 'font-weight: bold'
+    assert matcher.run_matches(data) == 'font-weight: bold'
+    assert matcher._memo == {data: 'font-weight: bold'}
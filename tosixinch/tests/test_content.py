@@ -172,12 +172,43 @@ class TestResolver:
         self.compare(doc, '//div[@id="img-slash2"]/img/@src',   '../x.jpg')
         self.compare(doc, '//div[@id="img-rel"]/img/@src',      '../x.jpg')
 
+    def test_data_url(self):
+        url = 'data:image/svg+xml,<svg fill="%23fff"></svg>#frag'
+        doc = """
+        <!DOCTYPE html><html><head><meta charset="utf-8"></head><body>
+            <div id="data"><img src='%s'></div>
+        </body></html>
+        """ % url
+        doc = self.resolve(doc)
+
+        self.compare(doc, '//div[@id="data"]/img/@src', url)
+
+
+def test_decode_data_url():
+    assert content.decode_data_url('data:image/png;base64,aGVs%0AbG8') == (
+        'image/png', b'hello')
+    assert content.decode_data_url('DATA:,a%20b') == ('text/plain', b'a b')
+    assert content.decode_data_url('data:;base64,@@@@') == (None, None)
+    assert content.decode_data_url('http://h/a.png') == (None, None)
+
 
 class TestIDTable:
 
     def check(self, t, child, url, expected):
         assert t.get(child, url) == expected
 
+    def test_memo(self):
+        table = (('x', ['a', 'b']),)
+        t = content.IDTable(table, hashid=True)
+        new = t.get('a', 'b#f')
+        assert t.id_cache == {('b', 'f'): new[1:]}
+
+        t.id_cache = {}  # reset (as Merger.merge does)
+        assert t.get('a', 'b#f') == new
+        assert t.id_cache == {('b', 'f'): new[1:]}
+        assert t.get('a', 'p#f') == 'p#f'
+        assert len(t.id_cache) == 1
+
     def test_id(self):
         table = (
             ('x',        ['a', 'b/bb']),
@@ -200,3 +231,57 @@ class TestIDTable:
         self.check(t, 'b/bb',   '../a#f',           '#f')
         self.check(t, 'b/bb',   '../c#f',           'y/yy#f')
         self.check(t, 'b/bb',   '../d/dd/ddd#f',    'y/yy#f')
+
+
+class TestMerger:
+
+    A = ('<!DOCTYPE html>\n<html><head><title>a</title>'
+        '<link href="s.css" rel="stylesheet"></head>'
+        '<body><h1 id="x">A</h1>'
+        '<p><a href="e/b.html#y">to b</a> <img src="i.png"></p>'
+        '</body></html>\n')
+    B = ('<html><head><title>b</title>'
+        '<link href="../s.css" rel="stylesheet">'
+        '<link href="t.css" rel="stylesheet"></head>'
+        '<body>\n<h2 id="y">B</h2>'
+        '<p><a href="../a.html#x">to a</a> <a href="#y">self</a></p>'
+        '\n</body></html>')
+
+    EXPECTED = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <title>root</title>
+  <link href="d/s.css" rel="stylesheet"><link href="d/e/t.css" rel="stylesheet"></head>
+  <body>
+<h1>root</h1>
+  <div id="a-html" class="tsi-body-merged"><h2 id="x">A</h2><p><a href="#y">to b</a> <img src="d/i.png"></p></div><div id="b-html" class="tsi-body-merged">
+<h3 id="y">B</h3><p><a href="#x">to a</a> <a href="#y">self</a></p>
+</div></body>
+</html>"""  # noqa: E501
+
+    def merge(self, tmp_path, monkeypatch, hashid=False):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'd' / 'e').mkdir(parents=True)
+        (tmp_path / 'd' / 'a.html').write_text(self.A)
+        (tmp_path / 'd' / 'e' / 'b.html').write_text(self.B)
+
+        root = content.build_new_html(title='root', content='<h1>root</h1>')
+        children = ['d/a.html', 'd/e/b.html']
+        table = (('r.html', children),)
+        content.Merger(root, 'r.html', children, table, hashid).merge()
+        # the root document itself is not changed
+        assert len(root.body) == 1
+        return (tmp_path / 'r.html').read_text()
+
+    def test_merge(self, tmp_path, monkeypatch):
+        assert self.merge(tmp_path, monkeypatch) == self.EXPECTED
+
+    def test_merge_hashid(self, tmp_path, monkeypatch):
+        text = self.merge(tmp_path, monkeypatch, hashid=True)
+        x = 'x-%s' % content.IDTable(None).get_checksum('d/a.html')
+        y = 'y-%s' % content.IDTable(None).get_checksum('d/e/b.html')
+        assert '<h2 id="%s">A</h2>' % x in text
+        assert '<a href="#%s">to b</a>' % y in text
+        assert '<h3 id="%s">B</h3>' % y in text
+        assert '<a href="#%s">to a</a>' % x in text
@@ -0,0 +1,301 @@
+
+import argparse
+
+import pytest
+
+from tosixinch import _ImportError
+from tosixinch import convert
+from tosixinch import pdfmerge
+
+
+def make_files(tmp_path, sizes):
+    files = []
+    for i, size in enumerate(sizes):
+        fname = tmp_path / ('%d.html' % i)
+        fname.write_bytes(b'x' * size)
+        files.append(str(fname))
+    return files
+
+
+def get_sizes(groups):
+    return [len(group) for group in groups]
+
+
+class TestSplitFiles:
+
+    def test_even(self, tmp_path):
+        files = make_files(tmp_path, [10] * 6)
+        groups = convert.split_files(files, 3)
+        assert get_sizes(groups) == [2, 2, 2]
+        assert sum(groups, []) == files
+
+    def test_uneven(self, tmp_path):
+        files = make_files(tmp_path, [100, 10, 10, 10, 10, 60])
+        groups = convert.split_files(files, 2)
+        assert get_sizes(groups) == [1, 5]
+
+    def test_many_workers(self, tmp_path):
+        files = make_files(tmp_path, [10, 10])
+        assert get_sizes(convert.split_files(files, 4)) == [1, 1]
+        assert get_sizes(convert.split_files(files, 0)) == [2]
+
+    def test_large_last(self, tmp_path):
+        # each group has at least one file
+        files = make_files(tmp_path, [1, 1, 1, 100])
+        groups = convert.split_files(files, 3)
+        assert len(groups) == 3
+        assert sum(groups, []) == files
+
+
+def test_pdfmerge(tmp_path):
+    pypdf = pytest.importorskip('pypdf')
+
+    documents = []
+    for i in range(2):
+        writer = pypdf.PdfWriter()
+        for _ in range(i + 1):
+            writer.add_blank_page(100, 100)
+        writer.add_outline_item('title%d' % i, 0)
+        fname = str(tmp_path / ('a-%d.pdf' % i))
+        writer.write(fname)
+        documents.append((fname, str(tmp_path / ('a-%d.html' % i))))
+
+    pdfname = str(tmp_path / 'a.pdf')
+    pdfmerge.DocumentMerger(documents).merge(pdfname)
+
+    reader = pypdf.PdfReader(pdfname)
+    assert len(reader.pages) == 3
+    outline = [(item.title, reader.get_destination_page_number(item))
+        for item in reader.outline]
+    assert outline == [('title0', 0), ('title1', 1)]
+
+
+class TestFragmentKey:
+
+    def make(self, tmp_path):
+        (tmp_path / 'a.css').write_text('p {}')
+        (tmp_path / 'a.png').write_bytes(b'png')
+        html = tmp_path / 'a.html'
+        html.write_text('<html><head>'
+            '<link href="a.css" rel="stylesheet"></head>'
+            '<body><img src="a.png"><img src="data:,x"></body></html>')
+        return str(html)
+
+    def test_key(self, tmp_path):
+        fname = self.make(tmp_path)
+        key = convert.get_fragment_key(fname, ['prince'])
+        assert convert.get_fragment_key(fname, ['prince']) == key
+        assert convert.get_fragment_key(fname, ['weasyprint']) != key
+
+        # css is compared by content
+        (tmp_path / 'a.css').write_text('p {}')
+        assert convert.get_fragment_key(fname, ['prince']) == key
+        (tmp_path / 'a.css').write_text('p {color: red;}')
+        key2 = convert.get_fragment_key(fname, ['prince'])
+        assert key2 != key
+
+        # image is compared by file stat
+        (tmp_path / 'a.png').write_bytes(b'png2')
+        assert convert.get_fragment_key(fname, ['prince']) != key2
+
+
+def make_pdf(pypdf, fname, num, dests=None, links=None):
+    g = pypdf.generic
+    writer = pypdf.PdfWriter()
+    for _ in range(num):
+        writer.add_blank_page(100, 100)
+    for name, page in (dests or {}).items():
+        writer.add_named_destination(name, page)
+    for action in links or []:
+        action = g.DictionaryObject({g.NameObject(k): v
+            for k, v in action.items()})
+        annot = g.DictionaryObject({
+            g.NameObject('/Type'): g.NameObject('/Annot'),
+            g.NameObject('/Subtype'): g.NameObject('/Link'),
+            g.NameObject('/Rect'): g.ArrayObject([g.FloatObject(0)] * 4),
+            g.NameObject('/A'): action,
+        })
+        writer.add_annotation(0, annot)
+    writer.write(fname)
+
+
+def test_document_merger(tmp_path):
+    pypdf = pytest.importorskip('pypdf')
+    g = pypdf.generic
+
+    a, b = tmp_path / 'a.html', tmp_path / 'b.html'
+    links = [
+        {'/S': g.NameObject('/URI'),
+            '/URI': g.TextStringObject(b.as_uri() + '#y')},
+        {'/S': g.NameObject('/URI'), '/URI': g.TextStringObject('b.html')},
+        {'/S': g.NameObject('/GoTo'), '/D': g.TextStringObject('x')},
+        {'/S': g.NameObject('/URI'),
+            '/URI': g.TextStringObject('https://example.com/b.html')},
+    ]
+    make_pdf(pypdf, str(tmp_path / 'a.pdf'), 2, {'x': 1}, links)
+    make_pdf(pypdf, str(tmp_path / 'b.pdf'), 3, {'x': 0, 'y': 2})
+
+    documents = [(str(tmp_path / 'a.pdf'), str(a)),
+        (str(tmp_path / 'b.pdf'), str(b))]
+    pdfname = str(tmp_path / 'c.pdf')
+    pdfmerge.DocumentMerger(documents).merge(pdfname)
+
+    reader = pypdf.PdfReader(pdfname)
+    assert len(reader.pages) == 5
+    targets = []
+    for annot in reader.pages[0]['/Annots']:
+        action = annot.get_object()['/A']
+        if action['/S'] == '/GoTo':
+            targets.append(reader.get_page_number(action['/D'][0].get_object()))
+        else:
+            targets.append(action['/URI'])
+    assert targets == [4, 2, 1, 'https://example.com/b.html']
+
+
+
+class TestNoPypdf:
+
+    def get_convert(self, cls, tmp_path, **kwargs):
+        c = cls.__new__(cls)
+        c._conf = None
+        c._encoding = None
+        c.arguments = None
+        c.files = make_files(tmp_path, [1, 2, 3])
+        c.pdfname = str(tmp_path / 'a.pdf')
+        c.workers = 2
+        c._table = None
+        c.__dict__.update(kwargs)
+        return c
+
+    def test_api(self, tmp_path, monkeypatch):
+        rendered = []
+        monkeypatch.setattr(pdfmerge, 'pypdf', _ImportError('pypdf'))
+        monkeypatch.setattr(convert.stylesheet, 'StyleSheet',
+            lambda conf: argparse.Namespace(stylesheets2=[]))
+        monkeypatch.setattr(convert, 'merge_htmls',
+            lambda files, pdfname, **kw: files)
+        monkeypatch.setattr(convert, '_weasyprint_render',
+            lambda *args: rendered.append(args))
+
+        c = self.get_convert(convert.WeasyPrintConvert, tmp_path, api=True)
+        c.run()
+        assert rendered == [(c.files, c.pdfname, [])]  # in one process
+
+
+def test_incremental_missing(tmp_path, monkeypatch):
+    def convert_parts(jobs):
+        for files, pdfname in jobs[1:]:  # the first one fails
+            with open(pdfname, 'wb') as f:
+                f.write(b'pdf')
+
+    c = TestNoPypdf().get_convert(convert.Convert, tmp_path)
+    c._conf = argparse.Namespace(
+        general=argparse.Namespace(download_dir=str(tmp_path / '_htmls')))
+    monkeypatch.setattr(c, '_get_settings', lambda: [])
+    monkeypatch.setattr(c, '_convert_parts', convert_parts)
+    with pytest.raises(FileNotFoundError):
+        c.run_incremental()
+    assert not (tmp_path / 'a.pdf').exists()
+
+
+@pytest.mark.parametrize('force, events', [
+    (False, ['key', 'run', 'key']),  # the second run is skipped
+    (True, ['run', 'key', 'run', 'key']),  # the key is only recorded
+])
+def test_run_force(tmp_path, monkeypatch, force, events):
+    monkeypatch.chdir(tmp_path)
+    called = []
+
+    class Convert(object):
+        pdfname = 'a.pdf'
+
+        def __init__(self, conf):
+            pass
+
+        def get_key(self):
+            called.append('key')
+            return 'key'
+
+        def run(self):
+            called.append('run')
+            with open(self.pdfname, 'wb') as f:
+                f.write(b'pdf')
+
+    monkeypatch.setattr(convert, 'PrinceConvert', Convert)
+    general = argparse.Namespace(converter='prince', force_convert=force,
+        download_dir='_htmls', incremental=False, volume_budget=0)
+    conf = argparse.Namespace(general=general)
+
+    convert.run(conf)
+    convert.run(conf)
+    assert called == events
+
+
+def test_document_merger_children(tmp_path):
+    pypdf = pytest.importorskip('pypdf')
+    g = pypdf.generic
+
+    # a-1.html is merged from a.html and b.html, a-2.html from c.html and d.html
+    a, b, c, d = (tmp_path / ('%s.html' % x) for x in 'abcd')
+    links = [
+        {'/S': g.NameObject('/URI'), '/URI': g.TextStringObject(d.as_uri())},
+        {'/S': g.NameObject('/URI'), '/URI': g.TextStringObject('c.html')},
+        {'/S': g.NameObject('/URI'),
+            '/URI': g.TextStringObject('a-2.html#x')},
+    ]
+    make_pdf(pypdf, str(tmp_path / 'a-1.pdf'), 2, {'a': 0, 'b': 1}, links)
+    make_pdf(pypdf, str(tmp_path / 'a-2.pdf'), 3, {'x': 1, 'd': 2})
+
+    documents = [(str(tmp_path / 'a-1.pdf'), str(tmp_path / 'a-1.html')),
+        (str(tmp_path / 'a-2.pdf'), str(tmp_path / 'a-2.html'))]
+    children = {documents[0][1]: [str(a), str(b)],
+        documents[1][1]: [str(c), str(d)]}
+    pdfname = str(tmp_path / 'a.pdf')
+    merger = pdfmerge.DocumentMerger(documents, children,
+        lambda path: path.split('/')[-1][:-5])
+    merger.merge(pdfname)
+
+    reader = pypdf.PdfReader(pdfname)
+    targets = []
+    for annot in reader.pages[0]['/Annots']:
+        action = annot.get_object()['/A']
+        targets.append(reader.get_page_number(action['/D'][0].get_object()))
+    assert targets == [4, 2, 3]
+
+
+def test_merge_htmls_table(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, href in (('a', 'c.html'), ('b', 'a.html#x'), ('c', 'b.html')):
+        with open('%s.html' % name, 'w') as f:
+            f.write('<html><body><p id="x"><a href="%s">%s</a></p>'
+                '</body></html>' % (href, name))
+
+    jobs = [(['a.html', 'b.html'], 'v-1.pdf'), (['c.html'], 'v-2.pdf')]
+    table = tuple((convert.get_merged_name(files, pdfname), files)
+        for files, pdfname in jobs)
+    assert table == (('v-1.html', ['a.html', 'b.html']),
+        ('c.html', ['c.html']))
+    assert convert.merge_htmls(*jobs[0], table=table) == 'v-1.html'
+    assert convert.merge_htmls(*jobs[1], table=table) == 'c.html'
+
+    with open('v-1.html') as f:
+        text = f.read()
+    assert 'href="c.html#c-html"' in text
+    assert 'href="#x"' in text
+
+
+def test_get_chapters(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rsrcs = ['https://a.com/a', '# chapter', 'https://a.com/b',
+        'https://a.com/c', 'https://a.com/d']
+    c = convert.Convert.__new__(convert.Convert)
+    c._conf = argparse.Namespace(_rfile='rsrcs.txt',
+        general=argparse.Namespace(raw=False),
+        sites=argparse.Namespace(_rsrcs=rsrcs))
+    c._toc_done = False
+    c.files = [c.get_filename(convert.location.Location(rsrc).efile)
+        for rsrc in rsrcs if not rsrc.startswith('#')]
+    assert c._get_chapters() == [0, 1, 1, 1]
+
+    c._toc_done = True
+    assert c._get_chapters() is None
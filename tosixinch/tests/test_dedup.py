@@ -0,0 +1,44 @@
+
+from tosixinch import dedup
+from tosixinch import lxml_html
+
+
+class Site:
+
+    def __init__(self, rsrc, text):
+        self.rsrc = rsrc
+        self.text = text
+
+
+def checksum(html, efile='_htmls/a/b.html'):
+    return dedup.efile_checksum(lxml_html.document_fromstring(html), efile)
+
+
+def test_dfile_checksum():
+    assert dedup.dfile_checksum('a  b\n c') == dedup.dfile_checksum('a b c ')
+    assert dedup.dfile_checksum('a b') != dedup.dfile_checksum('ab')
+    assert dedup.dfile_checksum(' \n ') is None
+
+
+def test_efile_checksum():
+    html = '<html><head><title>%s</title></head><body>%s</body></html>'
+    base = checksum(html % ('t1', '<h1>A</h1><p>b <img src="c.png"></p>'))
+    assert base == checksum(
+        html % ('t2', '<div><h1>A</h1>\n<p>b<img src="../a/c.png"></p></div>'))
+    assert base == checksum(
+        html % ('t1', '<h1>A</h1><p>b<img src="../c.png"></p>'),
+        efile='_htmls/a/b/c.html')
+    assert base != checksum(html % ('t1', '<h1>A</h1><p>b</p>'))
+    assert base != checksum(html % ('t1', '<h1>A</h1><p>b<img src="d.png">'))
+
+    assert checksum(html % ('t1', '')) is None
+    assert checksum('<html></html>') is None
+
+
+def test_check_dfile():
+    deduplicator = dedup.Deduplicator()
+    sites = [Site('a', 'aaa'), Site('b', ' aaa '), Site('c', 'ccc'),
+        Site('d', ''), Site('e', '')]
+    assert [deduplicator.check_dfile(site) for site in sites] == [
+        False, True, False, False, False]
+    assert deduplicator.duplicates == [(sites[1], sites[0])]
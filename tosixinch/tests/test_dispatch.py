@@ -0,0 +1,88 @@
+
+import argparse
+
+import pytest
+
+from tosixinch import dispatch
+
+
+class Site:
+
+    def __init__(self, name):
+        self.name = name
+        self.general = argparse.Namespace(ftype='html')
+
+
+def get_conf(names):
+    general = argparse.Namespace(
+        pipeline=True, dedup=False,
+        precmd1=[], postcmd1=[], pre_each_cmd1=[], post_each_cmd1=[],
+        precmd2=[], postcmd2=[], pre_each_cmd2=[], post_each_cmd2=[])
+    conf = argparse.Namespace(general=general,
+        sites=[Site(name) for name in names],
+        _userdir=None, _scriptdir=None, _user_scriptdir=None,
+        SCRIPTDIR='script')
+    return conf
+
+
+class TestPipeline:
+
+    def run(self, monkeypatch, names, download=None, extract=None):
+        done = []
+
+        def _download(conf, site):
+            if download:
+                download(site)
+            done.append(('1', site.name))
+
+        def _extract(conf, site):
+            if extract:
+                extract(site)
+            done.append(('2', site.name))
+
+        monkeypatch.setattr(dispatch, '_get_downloader', lambda c: _download)
+        monkeypatch.setattr(dispatch, '_get_extractor', lambda c: _extract)
+        dispatch._pipeline(get_conf(names))
+        return done
+
+    def test(self, monkeypatch):
+        names = ['a', 'b', 'c', 'd', 'e', 'f']
+        done = self.run(monkeypatch, names)
+        assert [name for action, name in done if action == '1'] == names
+        assert [name for action, name in done if action == '2'] == names
+        for name in names:
+            assert done.index(('1', name)) < done.index(('2', name))
+
+    def test_download_error(self, monkeypatch):
+        def download(site):
+            if site.name == 'c':
+                raise ValueError(site.name)
+
+        names = ['a', 'b', 'c', 'd']
+        with pytest.raises(ValueError):
+            self.run(monkeypatch, names, download=download)
+
+    def test_extract_error(self, monkeypatch):
+        def extract(site):
+            if site.name == 'b':
+                raise ValueError(site.name)
+
+        names = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j']
+        with pytest.raises(ValueError):
+            self.run(monkeypatch, names, extract=extract)
+
+    def test_cleanup(self, monkeypatch):
+        cleaned = []
+
+        def download(site):
+            dispatch.add_cleanup(cleaned.append, '1' + site.name)
+
+        def extract(site):
+            # all cleanups run only after both stages are done
+            assert cleaned == []
+            dispatch.add_cleanup(cleaned.append, '2' + site.name)
+
+        names = ['a', 'b', 'c']
+        self.run(monkeypatch, names, download=download, extract=extract)
+        assert sorted(cleaned) == ['1a', '1b', '1c', '2a', '2b', '2c']
+        assert dispatch._CLEANUP == []
@@ -0,0 +1,124 @@
+
+import argparse
+import base64
+import copy
+import hashlib
+import os
+
+import pytest
+
+from tosixinch import extract
+from tosixinch import imagescale
+from tosixinch import lxml_html
+
+
+HTML = """<html><head><title>aaa</title></head>
+<body class="bbb"><div>ccc</div>ddd<p>eee</p><span>fff</span></body>
+</html>
+"""
+
+
+def get_extract(html):
+    ext = extract.Extract.__new__(extract.Extract)
+    ext.root = lxml_html.document_fromstring(html)
+    return ext
+
+
+def dump(el):
+    return [(c.tag, c.text, c.tail) for c in el]
+
+
+class TestCopyRoot:
+
+    def test(self):
+        ext = get_extract(HTML)
+        body = ext.root.body
+        children = list(body)
+        expected = dump(body)
+
+        doc = ext._copy_root()
+        assert len(doc.body) == 0
+        assert doc.body.get('class') == 'bbb'
+        assert doc.xpath('//title/text()') == ['aaa']
+
+        assert list(body) == children
+        assert dump(body) == expected
+
+    def test_error(self, monkeypatch):
+        ext = get_extract(HTML)
+        body = ext.root.body
+        children = list(body)
+        expected = dump(body)
+
+        def deepcopy(obj):
+            raise MemoryError
+
+        monkeypatch.setattr(copy, 'deepcopy', deepcopy)
+        with pytest.raises(MemoryError):
+            ext._copy_root()
+
+        assert list(body) == children
+        assert dump(body) == expected
+
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGNgAAAAAgAB'
+    '4iG8MwAAAABJRU5ErkJggg==')
+PNG_URL = 'data:image/png;base64,' + base64.b64encode(PNG).decode('ascii')
+
+DATA_HTML = """<html><body>
+<img id="a" src="%s"><img id="b" src="%s"><img id="c" src="x.png">
+</body></html>
+""" % (PNG_URL, PNG_URL)
+
+
+class TestExternalize:
+
+    def get_resolver(self, html):
+        resolver = extract.Resolver.__new__(extract.Resolver)
+        resolver.doc = lxml_html.document_fromstring(html)
+        resolver.loc = argparse.Namespace(
+            PREFIX='_htmls', efile='_htmls/h/a/b.html')
+        resolver._scaler = None
+        resolver._images = []
+        return resolver
+
+    def test(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        resolver = self.get_resolver(DATA_HTML)
+        written = []
+        write = extract.system.write
+        monkeypatch.setattr(extract.system, 'write',
+            lambda fname, data: written.append(fname) or write(fname, data))
+        resolver.externalize_data_urls()
+
+        name = hashlib.sha1(PNG).hexdigest() + '.png'
+        fname = '_htmls/_data/' + name
+        with open(fname, 'rb') as f:
+            assert f.read() == PNG
+        assert written == [fname]  # the same image is written once
+
+        doc = resolver.doc
+        assert doc.xpath('//img[@id="a"]/@src') == ['../../_data/' + name]
+        assert doc.xpath('//img[@id="b"]/@src') == ['../../_data/' + name]
+        assert doc.xpath('//img[@id="c"]/@src') == ['x.png']
+        assert [fname for el, fname in resolver._images] == [fname, fname]
+
+        # already written (e.g. by other documents)
+        resolver = self.get_resolver(DATA_HTML)
+        resolver.externalize_data_urls()
+        assert written == [fname]
+        assert os.listdir('_htmls/_data') == [name]
+
+
+def test_get_scaler_no_pillow(monkeypatch, caplog):
+    monkeypatch.setattr(imagescale, 'Image',
+        imagescale._ImportError('Pillow'))
+    monkeypatch.setattr(extract, '_warned', set())
+    resolver = extract.Resolver.__new__(extract.Resolver)
+    resolver.loc = argparse.Namespace(
+        general=argparse.Namespace(downscale_dpi=150))
+    assert resolver._get_scaler() is None
+    assert resolver._get_scaler() is None
+    assert len(caplog.records) == 1
+    assert 'Pillow' in caplog.records[0].getMessage()
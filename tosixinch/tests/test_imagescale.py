@@ -0,0 +1,39 @@
+
+import os
+
+import pytest
+
+from tosixinch import imagescale
+
+
+def test_get_target_width():
+    assert imagescale.get_target_width('90mm 118mm', 254) == 900
+    assert imagescale.get_target_width('3in 4in', 100) == 300
+    with pytest.raises(ValueError):
+        imagescale.get_target_width('90em 118em', 100)
+
+
+def test_scale(tmp_path, monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    monkeypatch.chdir(tmp_path)
+    Image.new('RGB', (400, 300)).save('large.jpg')
+    Image.new('RGB', (100, 300)).save('small.png')
+    Image.new('RGB', (400, 300)).save('large.gif')
+
+    scaler = imagescale.Scaler('_htmls', 200)
+    fname = scaler.scale('large.jpg')
+    assert fname.startswith('_htmls/_derived/')
+    assert fname.endswith('.jpg')
+    with Image.open(fname) as im:
+        assert im.size == (200, 150)
+    assert imagescale.Scaler('_htmls', 200).scale('large.jpg') == fname
+
+    mtime = os.stat(fname).st_mtime_ns
+    imagescale._cache.clear()
+    assert imagescale.Scaler('_htmls', 200).scale('large.jpg') == fname
+    assert os.stat(fname).st_mtime_ns == mtime  # not resized again
+
+    assert imagescale.Scaler('_htmls', 100).scale('large.jpg') != fname
+    assert scaler.scale('small.png') is None
+    assert scaler.scale('large.gif') is None
+    assert scaler.scale('nonexistent.jpg') is None
@@ -0,0 +1,99 @@
+
+import io
+import struct
+
+import pytest
+
+from tosixinch import imagesize
+
+
+def png(w, h):
+    return (b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\x0dIHDR'
+        + struct.pack('>LL', w, h) + b'\x08\x02\x00\x00\x00')
+
+
+def jpeg(w, h):
+    app1 = b'\xff\xe1' + struct.pack('>H', 6000) + b'\x00' * 5998
+    sof2 = b'\xff\xc2' + struct.pack('>HBHHB', 11, 8, h, w, 3)
+    return b'\xff\xd8' + app1 + b'\xff\xff' + sof2 + b'\xff\xd9'
+
+
+def bmp(w, h):
+    return (b'BM' + b'\x00' * 12 + struct.pack('<L', 40)
+        + struct.pack('<ll', w, h))
+
+
+def webp(chunk, data):
+    return b'RIFF' + b'\x00' * 4 + b'WEBP' + chunk + b'\x00' * 4 + data
+
+
+def tiff(order, w, h):
+    entries = [(256, 3, 1, w), (257, 4, 1, h)]
+    data = (b'II*\x00' if order == '<' else b'MM\x00*')
+    data += struct.pack(order + 'L', 8)
+    data += struct.pack(order + 'H', len(entries))
+    for tag, type_, count, value in entries:
+        fmt = 'HHLHxx' if type_ == 3 else 'HHLL'
+        data += struct.pack(order + fmt, tag, type_, count, value)
+    return data
+
+
+def box(name, data, full=False):
+    if full:
+        data = b'\x00' * 4 + data
+    return struct.pack('>L', 8 + len(data)) + name + data
+
+
+def avif(sizes):
+    ispe = b''.join(box(b'ispe', struct.pack('>LL', *s), True) for s in sizes)
+    meta = box(b'meta', box(b'iprp', box(b'ipco', ispe)), True)
+    return box(b'ftyp', b'avif\x00\x00\x00\x00mif1avif') + meta
+
+
+DATA = [
+    (png(123, 45), ('png', 123, 45)),
+    (jpeg(123, 45), ('jpeg', 123, 45)),
+    (b'GIF89a' + struct.pack('<HH', 123, 45), ('gif', 123, 45)),
+    (bmp(123, -45), ('bmp', 123, 45)),
+    (webp(b'VP8 ', b'\x00\x00\x00\x9d\x01\x2a' + struct.pack('<HH', 123, 45)),
+        ('webp', 123, 45)),
+    (webp(b'VP8L', b'\x2f' + struct.pack('<L', 122 | (44 << 14))),
+        ('webp', 123, 45)),
+    (webp(b'VP8X', b'\x00' * 4 + (122).to_bytes(3, 'little')
+        + (44).to_bytes(3, 'little')), ('webp', 123, 45)),
+    (tiff('<', 123, 45), ('tiff', 123, 45)),
+    (tiff('>', 123, 45), ('tiff', 123, 45)),
+    (avif([(12, 4), (123, 45)]), ('avif', 123, 45)),
+    (b'<svg width="123" height="45px"></svg>', ('svg', 123, 45)),
+    (b'<?xml version="1.0"?>\n<svg\n viewBox="0 0 246 90" width="123">',
+        ('svg', 123, 45)),
+    (b"<!-- c --><svg height='0.5in' viewBox='0,0,2,1'>", ('svg', 96, 48)),
+]
+
+
+@pytest.mark.parametrize('data,expected', DATA)
+def test_get_size(data, expected):
+    assert imagesize.get_size(stream=io.BytesIO(data)) == expected
+
+
+def test_get_size_error():
+    for data in (b'hello', b'<svg width="100%">', png(0, 0)[:20]):
+        with pytest.raises(ValueError):
+            imagesize.get_size(stream=io.BytesIO(data))
+
+
+def test_get_sizes(tmp_path):
+    fnames = []
+    for i, (data, expected) in enumerate(DATA):
+        fname = tmp_path / str(i)
+        fname.write_bytes(data)
+        fnames.append(str(fname))
+    fnames.append(str(tmp_path / 'nonexistent'))
+
+    sizes = imagesize.get_sizes(fnames)
+    assert [sizes[fname] for fname in fnames] == (
+        [expected for data, expected in DATA] + [None])
+
+    # cache is validated by mtime and size
+    (tmp_path / '0').write_bytes(png(1, 2) + b'\x00')
+    assert imagesize.get_size(fnames[0]) == ('png', 1, 2)
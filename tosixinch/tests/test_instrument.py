@@ -0,0 +1,65 @@
+
+from tosixinch import instrument
+
+
+def test_record(tmp_path):
+    fname = str(tmp_path / 'report.tsv')
+    counts = iter([1, 1, 1, 3])
+
+    instrument.start()
+    try:
+        for _ in range(2):
+            with instrument.record('aaa', 'outer'):
+                with instrument.record('aaa', 'inner', lambda: next(counts)):
+                    data = [0] * 100000  # noqa: F841
+        stats = instrument._recorder.stats
+    finally:
+        instrument.stop(fname)
+
+    assert list(stats) == [('aaa', 'inner'), ('aaa', 'outer')]
+    inner, outer = stats[('aaa', 'inner')], stats[('aaa', 'outer')]
+    assert inner.calls == outer.calls == 2
+    assert (inner.before, inner.after) == (2, 4)
+    assert inner.peak >= 800000
+    assert outer.peak >= inner.peak
+    assert outer.time >= inner.time
+
+    with open(fname) as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('section\tstep\t')
+    assert lines[1].startswith('aaa\tinner\t2\t')
+
+
+def test_record_disabled():
+    assert instrument._recorder is None
+    with instrument.record('aaa', 'bbb'):
+        pass
+
+
+def test_record_threads(tmp_path):
+    import threading
+    fname = str(tmp_path / 'report.tsv')
+    entered = threading.Event()
+    done = threading.Event()
+
+    def other():
+        with instrument.record('bbb', 'other'):
+            entered.set()
+            done.wait()
+
+    instrument.start()
+    try:
+        with instrument.record('aaa', 'outer'):
+            thread = threading.Thread(target=other)
+            thread.start()
+            entered.wait()
+            with instrument.record('aaa', 'inner'):
+                pass
+        done.set()
+        thread.join()
+        stats = instrument._recorder.stats
+    finally:
+        instrument.stop(fname)
+
+    assert sorted(stats) == [('aaa', 'inner'), ('aaa', 'outer'),
+        ('bbb', 'other')]
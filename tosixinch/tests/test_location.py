@@ -198,6 +198,43 @@ class TestLocalReference:
         self.compare(url, dfile, ref)
 
 
+class TestCache:
+
+    def test_locations(self):
+        locs = location.Locations(rsrcs=['# aaa', 'bbb', ' ccc\n', ''])
+        assert locs.rsrcs == ['bbb', 'ccc']
+        assert locs.rsrcs is locs.rsrcs
+        assert len(locs) == 2
+
+    def test_location(self, monkeypatch):
+        calls = []
+        unroot = location.urlmap.URL.unroot
+
+        def _unroot(self):
+            calls.append(self)
+            return unroot(self)
+
+        monkeypatch.setattr(location.urlmap.URL, 'unroot', _unroot)
+        name = 'a' * 300
+        loc = location.Location('https://aaa.org/' + name)
+        assert loc.dfile == loc.efile
+        assert loc.dfile.startswith('_htmls/_hash/')
+        assert len(calls) == 1
+
+        # prefix is not cached
+        loc.PREFIX = 'xxx'
+        assert loc.dfile.startswith('xxx/_hash/')
+        assert len(calls) == 1
+
+    def test_slots(self):
+        loc = location.Location('https://aaa.org/bbb.html')
+        comp = location.Component('ccc.jpg', loc)
+        assert not hasattr(comp, '__dict__')
+        assert not hasattr(comp._cls, '__dict__')
+        comp.dfile = 'ddd.jpg'  # assignable
+        assert comp.dfile == 'ddd.jpg'
+
+
 class TestReplacementParser:
 
     rsrcs = ['https://www.reddit.com/aaa', 'https://www.reddit.com/bbb']
@@ -1,11 +1,12 @@
 
 import io
 import textwrap
+import threading
 
 import lxml.etree
 import pytest
 
-from tosixinch import lxml_html
+from tosixinch import _lxml_html, lxml_html
 
 TEXT = """
     <html>
@@ -57,6 +58,33 @@ def test_fromstring():
     _check_elements(root)
 
 
+def test_parser_reuse():
+    assert _lxml_html._get_parser() is _lxml_html._get_parser()
+    root = lxml_html.document_fromstring(TEXT)
+    _check_elements(root)
+    root = lxml_html.document_fromstring(TEXT)
+    _check_elements(root)
+
+    parsers = []
+    thread = threading.Thread(
+        target=lambda: parsers.append(_lxml_html._get_parser()))
+    thread.start()
+    thread.join()
+    assert parsers[0] is not _lxml_html._get_parser()
+
+
+def test_make_elements():
+    attribs = [{'class': 'aaa', 'href': 'a.css', 'rel': 'stylesheet'},
+        {'class': 'aaa', 'href': 'b c.css', 'rel': 'stylesheet'}]
+    els = lxml_html.make_elements('link', attribs)
+    assert isinstance(els[0], lxml_html.HtmlElement)
+    for el, attrib in zip(els, attribs):
+        htmlstr = '<link class="%s" href="%s" rel="%s">' % tuple(
+            attrib.values())
+        expected = lxml_html.fragment_fromstring(htmlstr)
+        assert lxml_html.tostring(el) == lxml_html.tostring(expected)
+
+
 def test_error_message():
     msg = """
         //div[@class==="aaa"
@@ -69,3 +97,86 @@ def test_error_message():
         el = root.xpath('//div[@class==="aaa"')
 
     assert msg in str(excinfo.value)
+
+
+class TestDocumentCache:
+
+    def test_share(self, tmp_path, monkeypatch):
+        fname = str(tmp_path / 'aaa.html')
+        with open(fname, 'w') as f:
+            f.write(TEXT)
+        cache = lxml_html.DocumentCache()
+        monkeypatch.setattr(_lxml_html, 'doc_cache', cache)
+
+        root = lxml_html.read(fname, cache='share')
+        _check_elements(root)
+        assert lxml_html.read(fname, cache='share') is root
+        assert lxml_html.read(fname, codings=['cp1252'], cache='share') \
+            is not root
+        assert len(cache) == 2
+
+        assert lxml_html.read(fname, cache='pop') is root
+        assert lxml_html.read(fname, cache='pop') is not root
+        assert lxml_html.read(fname) is not root
+        assert len(cache) == 1
+
+    def test_write(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        fname = 'aaa.html'
+        cache = lxml_html.DocumentCache()
+        monkeypatch.setattr(_lxml_html, 'doc_cache', cache)
+
+        lxml_html.write(fname, text=TEXT)
+        root = lxml_html.read(fname, cache='share')
+        lxml_html.write(fname, text=TEXT)
+        assert len(cache) == 0
+
+        root = lxml_html.read(fname, cache='share')
+        # modified by others
+        with open(fname, 'w') as f:
+            f.write(MIN_TEXT + '\n' * 100)
+        assert cache.get(fname, ((), 'strict')) is None
+        assert lxml_html.read(fname, cache='share').body is None
+        assert root.body is not None
+
+    def test_maxsize(self, tmp_path):
+        size = len(TEXT) * _lxml_html.DOC_SIZE_FACTOR
+        cache = lxml_html.DocumentCache(maxsize=size * 2)
+        doc = lxml_html.document_fromstring(TEXT)
+        fnames = [str(tmp_path / ('%d.html' % i)) for i in range(3)]
+        for fname in fnames:
+            with open(fname, 'w') as f:
+                f.write(TEXT)
+            cache.set(fname, doc)
+        assert len(cache) == 2
+        assert cache.get(fnames[0]) is None
+        assert cache.get(fnames[2])[0] is doc
+
+        cache = lxml_html.DocumentCache(maxsize=size - 1)
+        cache.set(fnames[0], doc)
+        assert len(cache) == 0
+
+    def test_encoding(self, tmp_path, monkeypatch):
+        fname = str(tmp_path / 'aaa.html')
+        with open(fname, 'w', encoding='cp1252') as f:
+            f.write(TEXT.replace('p text', 'p text \xe9'))
+        cache = lxml_html.DocumentCache()
+        monkeypatch.setattr(_lxml_html, 'doc_cache', cache)
+
+        codings = ['utf-8', 'cp1252']
+        for _ in range(2):
+            reader = _lxml_html.HtmlReader(
+                fname, codings=codings, cache='share')
+            reader.read()
+            assert reader.encoding == 'cp1252'
+
+    def test_no_cache(self, tmp_path, monkeypatch):
+        fname = str(tmp_path / 'aaa.html')
+        with open(fname, 'w') as f:
+            f.write(TEXT)
+        cache = lxml_html.DocumentCache()
+        monkeypatch.setattr(_lxml_html, 'doc_cache', cache)
+
+        _check_elements(lxml_html.read(fname))
+        _check_elements(lxml_html.read(fname, cache='pop'))
+        assert len(cache) == 0
@@ -1,7 +1,20 @@
 
+import os
+import subprocess
+import sys
+
+import pytest
+
+import tosixinch.configfetch
 import tosixinch.main
 
 
+@pytest.fixture(autouse=True)
+def cachedir(tmp_path, monkeypatch):
+    # not to write config snapshots to the user's directory
+    monkeypatch.setenv('TOSIXINCH_CACHEDIR', str(tmp_path / 'cache'))
+
+
 class TestParse:
 
     def test_add_binary_extension(self):
@@ -24,3 +37,54 @@ class TestParse:
         conf = tosixinch.main._main(args=args)
         assert len(conf.general.add_binary_extensions) == num - 1
         assert 'pdf' not in conf.general.add_binary_extensions
+
+
+class TestConfArgs:
+
+    ARGS = [
+        ['-1', '-2', '-3', '--pdfname', 'a.pdf', '--nouserdir'],
+        ['-i', 'a.html', '--add-binary-extensions=-pdf', '--trimdirs', '-1'],
+        ['--input=a.html', '--prince', '--no-parts-download'],
+    ]
+
+    def parse(self, parser, conf_parser, args):
+        _args = tosixinch.configfetch.minusadapter(
+            parser, matcher='(--add-.+|--trimdirs)', args=args)
+        parsed = parser.parse_args(_args)
+        return _args, tosixinch.main._get_confargs(conf_parser, parsed)
+
+    def test_confargs(self):
+        conf, parser, conf_parser = tosixinch.main._get_parsers()
+        for args in self.ARGS:
+            _args, confargs = self.parse(parser, conf_parser, args)
+
+            # the same as parsing again by the configuration part only
+            expected, _ = conf_parser.parse_known_args(_args)
+            assert confargs == expected, args
+
+    def test_abbreviation(self):
+        conf, parser, conf_parser = tosixinch.main._get_parsers()
+        args = ['-i', 'a.html', '--pdfn', 'a.pdf', '--princ']
+        _, confargs = self.parse(parser, conf_parser, args)
+        assert confargs.pdfname == 'a.pdf'
+        assert confargs.converter == 'prince'
+
+        args = ['-123v', '-ia.html', '--pdfname=a.pdf']  # concatenated
+        _, confargs = self.parse(parser, conf_parser, args)
+        assert confargs.pdfname == 'a.pdf'
+        assert not hasattr(confargs, 'verbose')
+
+
+def test_lazy_imports(tmp_path):
+    # metadata commands (e.g. '--check') should not import lxml
+    code = ('import sys; import tosixinch.main; '
+        'tosixinch.main._main(["--nouserdir", "--check", "-i", "a.html"]); '
+        'print(",".join(sorted(sys.modules)))')
+    env = dict(os.environ, TOSIXINCH_CACHEDIR='')
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    ret = subprocess.run([sys.executable, '-c', code], cwd=tmp_path,
+        env=env, capture_output=True, text=True, check=True)
+    modules = ret.stdout.strip().split('\n')[-1].split(',')
+    assert 'tosixinch.settings' in modules
+    assert not [m for m in modules if m.startswith('lxml')]
+    assert 'tosixinch.action' not in modules
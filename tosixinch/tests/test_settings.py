@@ -46,6 +46,12 @@ class TestParse:
         exclude_value = '//div[@class="side"]'
         assert site.exclude == exclude_value
 
+    def test_site_slots(self, site):
+        with pytest.raises(AttributeError):
+            site.no_such_attribute = 1
+        site.ftype = 'html'
+        assert site.ftype == 'html'
+
     def test_parse_cnvopts(self, conf):
         opts = ['--javascript',
             '--font', 'DejaVu Sans Mono', '-A', '1', '-B', '2']
@@ -78,3 +84,262 @@ class TestPDFName:
         # with querry
         rsrc = 'https://aaa.com/bbb?s=3+t=5&u=7+8'
         self.compare(rsrc, 'x', 1, 'x-bbb-s-3-t-5-u-7-8.pdf')
+
+
+def _checkmatch_naive(rsrc, items):
+    # The previous implementation, to compare.
+    import fnmatch
+    import urllib.parse
+
+    def checkslash(rsrc):
+        upath = urllib.parse.urlsplit(rsrc)[2]
+        num = len(upath.split('/'))
+        if upath == '':
+            num = -1
+        return num
+
+    lower = rsrc.lower()
+    matches = [m for sec, m in items if fnmatch.fnmatch(lower, m.lower())]
+    if len(matches) == 0:
+        matched = 'http://tosixinch.example.com'
+    else:
+        matched = sorted(matches, key=checkslash)[-1]
+    for sec, match in items:
+        if match == matched:
+            return sec
+
+
+class TestSiteMatcher:
+
+    ITEMS = [
+        ('scriptdefault', 'http://tosixinch.example.com'),
+        ('wikipedia', 'https://*.wikipedia.org/wiki/*'),
+        ('github', 'https://github.com/*'),
+        ('github_issues', 'https://github.com/*/issues/*'),
+        ('github_any', 'https://GitHub.com/*/*/*/*'),
+        ('github_dup', 'https://github.com/*'),
+        ('hn', 'https://news.ycombinator.com/item?*'),
+        ('any', '*/wiki/*'),
+        ('local', '/home/*/a.html'),
+        ('local2', '/home/x/*'),
+        ('host', 'https://example.com'),
+        ('host2', 'https://example.com*'),
+    ]
+
+    RSRCS = [
+        'https://en.wikipedia.org/wiki/Foo',
+        'https://github.com/a/b',
+        'https://github.com/a/b/issues/1',
+        'https://GITHUB.com/a/b/pull/1',
+        'https://github.com',
+        'https://news.ycombinator.com/item?id=1',
+        'https://news.ycombinator.com/news',
+        'https://example.org/wiki/Foo',
+        '/home/x/a.html',
+        '/home/y/a.html',
+        'https://example.com',
+        'https://example.com/a',
+        'http://unknown.example.org/',
+        'a.html',
+    ]
+
+    def test_match(self):
+        matcher = tosixinch.settings.SiteMatcher(self.ITEMS)
+        for rsrc in self.RSRCS:
+            expected = _checkmatch_naive(rsrc, self.ITEMS)
+            assert matcher.match(rsrc) == expected, rsrc
+
+    def test_match_no_default(self):
+        items = self.ITEMS[1:]
+        matcher = tosixinch.settings.SiteMatcher(items)
+        assert matcher.match('a.html') is None
+        assert matcher.match('https://github.com/a') == 'github'
+
+    def test_config_changes(self):
+        config = tosixinch.settings.ZConfigParser()
+        config.read_dict({'github': {'match': 'https://github.com/*'}})
+        rsrc = 'https://github.com/a'
+        assert tosixinch.settings._checkmacth(rsrc, config) == 'github'
+        config.set('github', 'match', 'https://gitlab.com/*')
+        assert tosixinch.settings._checkmacth(rsrc, config) is None
+
+
+FINI = """
+[aa]
+bb=          :: f: comma
+             xxx, yyy
+cc=          zzz
+
+[dd]
+bb=
+cc=          www
+"""
+
+
+class TestConfigFetch:
+
+    def fetch(self):
+        conf = tosixinch.settings.ConfigFetch()
+        conf.fetch(FINI)
+        return conf
+
+    def test_section(self):
+        conf = self.fetch()
+        assert conf.aa.bb == ['xxx', 'yyy']
+
+        # returns a copy
+        conf.aa.bb.append('vvv')
+        assert conf.aa.bb == ['xxx', 'yyy']
+
+        conf.aa.set_value('bb', 'uuu')
+        assert conf.aa.bb == ['uuu']
+
+        conf.set_arguments(argparse.Namespace(bb='ttt'))
+        assert conf.aa.bb == ['ttt']
+
+        conf.set_arguments(argparse.Namespace())
+        conf.read_string('[aa]\nbb=sss')
+        assert conf.aa.bb == ['sss']
+
+        conf._config['aa']['bb'] = 'rrr'
+        assert conf.aa.bb == ['rrr']
+
+    def test_double(self):
+        conf = self.fetch()
+        double = tosixinch.settings.Double(conf.dd, conf.aa)
+        assert double.bb == ['xxx', 'yyy']
+        assert double.cc == 'www'
+
+        conf.dd.set_value('cc', '')
+        assert double.cc == 'zzz'
+
+        parent = self.fetch()
+        double = tosixinch.settings.Double(conf.dd, parent.aa)
+        parent.aa.set_value('cc', 'sss')
+        assert double.cc == 'sss'
+
+
+ZINI = """
+[DEFAULT]
+aa = default
+
+[bb]
+aa = bb
+bb = bb
+
+[cc : bb]
+cc = cc
+
+[dd : cc]
+bb = dd
+"""
+
+
+class TestZConfigParser:
+
+    @pytest.fixture
+    def config(self):
+        config = tosixinch.settings.ZConfigParser()
+        config.read_string(ZINI)
+        return config
+
+    def test_get(self, config):
+        assert config.get('dd', 'aa') == 'bb'
+        assert config.get('dd', 'bb') == 'dd'
+        assert config.get('dd', 'cc') == 'cc'
+        assert config.get('cc : bb', 'bb') == 'bb'
+        assert config.get('DEFAULT', 'aa') == 'default'
+
+        assert config.get('dd', 'bb', vars={'bb': 'vars'}) == 'vars'
+        assert config.get('dd', 'bb') == 'dd'
+
+    def test_no_option(self, config):
+        zconfigparser = tosixinch.settings.zconfigparser
+        with pytest.raises(zconfigparser.NoZOptionError):
+            config.get('dd', 'xx')
+        with pytest.raises(zconfigparser.NoZSectionError):
+            config.get('xx', 'aa')
+
+    def test_change(self, config):
+        changes = config.changes
+        assert config.get('dd', 'cc') == 'cc'
+        config.set('cc : bb', 'cc', 'new')
+        assert config.get('dd', 'cc') == 'new'
+        config.remove_option('cc : bb', 'cc')
+        with pytest.raises(tosixinch.settings.zconfigparser.NoZOptionError):
+            config.get('dd', 'cc')
+
+        config.read_string('[bb]\nbb = read')
+        assert config.get('cc', 'bb') == 'read'
+        config['DEFAULT']['ee'] = 'default'
+        assert config.get('dd', 'ee') == 'default'
+        config.read_string('[ee : dd]')
+        assert config.get('ee', 'bb') == 'dd'
+        assert config.changes > changes
+
+    def test_duplicate(self, config):
+        zconfigparser = tosixinch.settings.zconfigparser
+        with pytest.raises(zconfigparser.DuplicateZKeyError):
+            config.read_string('[dd : bb]')
+        # the same parents are OK
+        assert config.get('dd', 'bb') == 'dd'
+        config.read_string('[dd : cc]\nee = ee')
+        assert config.get('dd', 'ee') == 'ee'
+
+    def test_recursive(self):
+        config = tosixinch.settings.ZConfigParser()
+        config.read_string('[aa : bb]\n[bb : cc]\n[cc : aa]')
+        with pytest.raises(tosixinch.settings.zconfigparser.RecursiveZkeyError):
+            config.get('aa', 'xx')
+
+
+class TestSnapshot:
+
+    def get_conf(self):
+        args = argparse.Namespace(nouserdir=True, userdir=None)
+        envs = {'cachedir': 'TOSIXINCH_CACHEDIR'}
+        conf = tosixinch.settings.Conf(args=args, envs=envs)
+        conf.user_init(args)
+        return conf
+
+    def get_state(self, conf):
+        return [(c._ctx, {name: c._config.items(name, raw=True)
+            for name in c._config.sections()})
+            for c in (conf._appconf, conf._siteconf)]
+
+    def test_snapshot(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        cachedir = tmp_path / 'cache'
+        monkeypatch.setenv('TOSIXINCH_CACHEDIR', str(cachedir))
+
+        conf = self.get_conf()
+        assert sorted(p.name for p in cachedir.iterdir()) == [
+            'config.json', 'user_config.json']
+
+        def fail(*args, **kwargs):
+            raise AssertionError('config files are parsed again')
+
+        with monkeypatch.context() as m:
+            m.setattr(tosixinch.settings, '_read_configs', fail)
+            m.setattr(tosixinch.settings, '_read_user_configs', fail)
+            conf2 = self.get_conf()
+        assert self.get_state(conf2) == self.get_state(conf)
+        assert conf2.general.encoding == conf.general.encoding
+        parser = argparse.ArgumentParser(add_help=False)
+        parser = conf2._appconf.build_arguments(parser, 'general')
+        assert '--downloader' not in parser.format_help()
+
+        # changing config files invalidates the cache
+        (tmp_path / 'tosixinch.ini').write_text('[general]\nencoding=aaa')
+        assert self.get_conf().general.encoding == ['aaa']
+
+        # broken files are ignored
+        (cachedir / 'user_config.json').write_text('{"key": ')
+        assert self.get_conf().general.encoding == ['aaa']
+
+    def test_no_cachedir(self, tmp_path, monkeypatch):
+        monkeypatch.delenv('TOSIXINCH_CACHEDIR', raising=False)
+        envs = {'cachedir': 'TOSIXINCH_CACHEDIR'}
+        assert tosixinch.settings._get_cachedir(envs) is None
+        monkeypatch.setenv('TOSIXINCH_CACHEDIR', '')
+        assert tosixinch.settings._get_cachedir(envs) is None
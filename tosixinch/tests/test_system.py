@@ -0,0 +1,88 @@
+
+import sys
+
+import pytest
+
+from tosixinch import system
+
+
+USER_MODULES = {
+    'aaa.py': (
+        'def dup(el):\n    el.append("aaa.dup")\n'
+        'def user_only(el, *args):\n    el.append(("aaa", args))\n'
+        'def add_h1(el):\n    el.append("aaa.add_h1")\n'),
+    'bbb.py': 'def dup(el):\n    el.append("bbb.dup")\n',
+}
+
+
+@pytest.fixture
+def userdir(tmp_path, monkeypatch):
+    d = tmp_path / 'process'
+    d.mkdir()
+    for name, text in USER_MODULES.items():
+        (d / name).write_text(text)
+
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    for name in ('_mod_cache', '_obj_cache', '_registry_cache', '_func_cache'):
+        monkeypatch.setattr(system, name, {})
+    yield str(tmp_path)
+    for name in list(sys.modules):
+        if name == 'process' or name.startswith('process.'):
+            del sys.modules[name]
+
+
+class TestProcessFunction:
+
+    def test_user_function(self, userdir):
+        el = []
+        system.run_function(userdir, 'process', el, 'user_only?x?y')
+        assert el == [('aaa', ('x', 'y'))]
+
+    def test_override(self, userdir):
+        el = []
+        system.run_function(userdir, 'process', el, 'add_h1')
+        assert el == ['aaa.add_h1']
+
+    def test_duplicate(self, userdir):
+        el = []
+        with pytest.raises(ValueError) as excinfo:
+            system.run_function(userdir, 'process', el, 'dup')
+        assert 'aaa.dup, bbb.dup' in str(excinfo.value)
+
+        system.run_function(userdir, 'process', el, 'bbb.dup')
+        assert el == ['bbb.dup']
+
+    def test_not_found(self, userdir):
+        with pytest.raises(AttributeError):
+            system.run_function(userdir, 'process', [], 'no_such_function')
+
+    def test_no_user_package(self, tmp_path, userdir):
+        func = system.get_function(
+            str(tmp_path / 'none'), 'process', 'lower_heading')
+        assert func.name == 'lower_heading'
+        assert func.func.__module__ == 'tosixinch.process.sample'
+
+    def test_get_functions(self, userdir):
+        funcs = system.get_functions(
+            userdir, 'process', ['user_only?x', 'bbb.dup'])
+        assert system.get_function(userdir, 'process', 'bbb.dup') is funcs[1]
+
+        el = []
+        for func in funcs:
+            func(el)
+        assert el == [('aaa', ('x',)), 'bbb.dup']
+
+
+def test_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = system.Manifest('_htmls/a.json')
+    assert manifest.check('a.pdf', 'key') is False
+    manifest.record('a.pdf', 'key')
+    manifest.save()
+    assert manifest.check('a.pdf', 'key') is False  # no output file
+
+    (tmp_path / 'a.pdf').write_bytes(b'%PDF')
+    manifest = system.Manifest('_htmls/a.json')
+    assert manifest.check('a.pdf', 'key') is True
+    assert manifest.check('a.pdf', 'key2') is False
+    assert manifest.check('a.pdf', None) is False
@@ -1,7 +1,12 @@
 
+import argparse
 import os
 import textwrap
 
+import pytest
+
+from tosixinch import location
+from tosixinch import system
 from tosixinch import toc
 
 
@@ -97,3 +102,97 @@ class TestNodes:
                 ddd
         """
         check(ulist, expected)
+
+
+class TestMerge:
+
+    RSRCS = ['# aaa', 'http://h/a.html', '# bbb', 'http://h/b.html']
+
+    def merge(self, **kwargs):
+        manifest = system.Manifest('_htmls/_toc.json')
+        nodes = toc.Nodes(self.RSRCS, 'rsrcs.txt', 'rsrcs-toc.txt')
+        nodes.merge(manifest=manifest, **kwargs)
+        return [node.root for node in nodes.nodes]
+
+    def test_merge(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / '_htmls' / 'h').mkdir(parents=True)
+        for name in ('a', 'b'):
+            html = '<html><body><p>%s</p></body></html>' % name
+            (tmp_path / '_htmls' / 'h' / ('%s.html' % name)).write_text(html)
+
+        roots = self.merge()
+        assert 'rsrcs.txt' in (tmp_path / 'rsrcs-toc.txt').read_text()
+        assert '<p>b</p>' in (tmp_path / roots[1]).read_text()
+
+        # not changed
+        for root in roots:
+            (tmp_path / root).write_text('old')
+        self.merge()
+        assert [(tmp_path / root).read_text() for root in roots] == [
+            'old', 'old']
+
+        # 'b' changed, and with workers
+        html = '<html><body><p>bb</p></body></html>'
+        (tmp_path / '_htmls' / 'h' / 'b.html').write_text(html)
+        self.merge(workers=2)
+        assert (tmp_path / roots[0]).read_text() == 'old'
+        assert '<p>bb</p>' in (tmp_path / roots[1]).read_text()
+
+        self.merge(workers=2, force=True)
+        assert '<p>a</p>' in (tmp_path / roots[0]).read_text()
+
+
+class Sites(list):
+    _rsrcs = None
+
+
+class TestDedup:
+
+    RSRCS = ['# aaa', 'http://h/a.html', 'http://h/b.html', 'http://h/c.html',
+        '# bbb', 'http://h/d.html', '#', 'http://h/e.html']
+    TEXTS = {'a': 'aaa', 'b': 'aaa', 'c': 'ccc', 'd': 'ccc', 'e': 'eee'}
+
+    def get_conf(self, dedup):
+        sites = []
+        for rsrc in self.RSRCS:
+            if rsrc.startswith('#'):
+                continue
+            loc = location.Location(rsrc)
+            name = loc.efile[-6]
+            # duplicates are not extracted (no efiles)
+            dfile = loc.efile + '.orig'
+            with open(dfile, 'w') as f:
+                f.write(self.TEXTS[name])
+            general = argparse.Namespace(
+                encoding=['utf-8'], encoding_errors='strict')
+            sites.append(argparse.Namespace(rsrc=loc.rsrc, dfile=dfile,
+                efile=loc.efile, text=self.TEXTS[name], general=general))
+            if name in 'ace':
+                html = '<html><body><p>%s</p></body></html>' % name
+                with open(loc.efile, 'w') as f:
+                    f.write(html)
+
+        sites = Sites(sites)
+        sites._rsrcs = self.RSRCS
+        general = argparse.Namespace(
+            dedup=dedup, force_toc=False, workers=1, download_dir='_htmls')
+        return argparse.Namespace(sites=sites, general=general,
+            _rfile='rsrcs.txt')
+
+    def test(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / '_htmls' / 'h').mkdir(parents=True)
+        conf = self.get_conf(dedup=False)
+        with pytest.raises(FileNotFoundError):
+            toc.run(conf)
+
+        conf.general.dedup = True
+        toc.run(conf)
+        tocfile = (tmp_path / 'rsrcs-toc.txt').read_text().split('\n')
+        assert tocfile[1:] == [
+            'http://tosixinch.example.com/aaa', 'http://h/e.html']
+
+        merged = (tmp_path / location.Location(tocfile[1]).efile).read_text()
+        assert '<p>a</p>' in merged
+        assert '<p>c</p>' in merged
@@ -0,0 +1,50 @@
+
+import struct
+
+from tosixinch import volume
+
+
+def make_png(fname, width, height):
+    data = b'\x89PNG\r\n\x1a\n' + struct.pack('>L', 13) + b'IHDR'
+    data += struct.pack('>LL', width, height) + b'\x08\x06\x00\x00\x00'
+    fname.write_bytes(data)
+
+
+def test_estimate_cost(tmp_path):
+    make_png(tmp_path / 'a.png', 100, 50)
+    html = tmp_path / 'a.html'
+    html.write_text('<html><body><p>a</p>'
+        '<img src="a.png"><img src="b.png"></body></html>')
+    size = html.stat().st_size
+
+    cost = volume.estimate_cost(str(html))
+    elements = 5  # html, body, p, img, img
+    assert cost == (size * volume.BYTE_COST
+        + elements * volume.ELEMENT_COST
+        + 100 * 50 * volume.PIXEL_COST)
+
+
+def test_split(monkeypatch):
+    costs = {'a': 3, 'b': 3, 'c': 5, 'd': 20, 'e': 1}
+    monkeypatch.setattr(volume, 'estimate_cost',
+        lambda fname, codings: costs[fname])
+
+    volumes = volume.split(list(costs), 10)
+    assert volumes == [['a', 'b'], ['c'], ['d'], ['e']]
+    assert volume.split(list(costs), 100) == [list(costs)]
+
+
+def test_split_chapters(monkeypatch):
+    costs = {'a': 3, 'b': 3, 'c': 5, 'd': 2, 'e': 20, 'f': 1}
+    monkeypatch.setattr(volume, 'estimate_cost',
+        lambda fname, codings: costs[fname])
+
+    # split before 'c' (chapter 1), not between 'c' and 'd'
+    volumes = volume.split(list(costs), 10, chapters=[0, 0, 1, 1, 2, 2])
+    assert volumes == [['a', 'b'], ['c', 'd'], ['e'], ['f']]
+
+    # a chapter over budget is split by files
+    volumes = volume.split(list(costs), 10, chapters=[0, 0, 0, 0, 1, 1])
+    assert volumes == [['a', 'b'], ['c', 'd'], ['e'], ['f']]
+    volumes = volume.split(list(costs), 12, chapters=[0, 1, 1, 1, None, 2])
+    assert volumes == [['a'], ['b', 'c', 'd'], ['e'], ['f']]
@@ -4,13 +4,17 @@
 Use comment structure in 'rsrcs.txt' as directive.
 """
 
+import concurrent.futures
+import hashlib
 import logging
 import os
 import re
 import urllib.parse
 
 from tosixinch import content
+from tosixinch import dedup
 from tosixinch import location
+from tosixinch import system
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +23,8 @@ COMMENT_PREFIX = ';'
 
 TOCDOMAIN = 'http://tosixinch.example.com'
 
+MANIFEST = '_toc.json'
+
 
 def get_tocfile(rfile):
     if rfile:
@@ -32,6 +38,18 @@ def _create_toc_url(title):
     return '%s/%s' % (TOCDOMAIN, urllib.parse.quote(t))
 
 
+def _make_toc_html(title):
+    title = title or content.DEFAULT_TITLE
+    content_ = '<h1>%s</h1>' % title
+    return content.build_new_html(title=title, content=content_)
+
+
+def _merge(root, children, title, table):
+    # Top level function, to be called in a worker process.
+    doc = _make_toc_html(title)
+    content.Merger(doc, root, children, table).merge()
+
+
 class Node(object):
     """Represent one non-blank line in rfile."""
 
@@ -40,21 +58,28 @@ class Node(object):
         self._children = children
         self.title = title
 
-        self.doc = self._make_toc_html()
         self._loc = location.Location(root)
         self.rsrc = self._loc.rsrc
         self.root = self._loc.efile
         self.children = [location.Location(child).efile for child in children]
 
-    def _make_toc_html(self):
-        title = self.title or content.DEFAULT_TITLE
-        content_ = '<h1>%s</h1>' % title
-        return content.build_new_html(title=title, content=content_)
+    def get_key(self, table):
+        """Return a checksum of the merge inputs (the children and table)."""
+        h = hashlib.sha1()
+        h.update(repr((self.title, self.root, table)).encode('utf-8'))
+        for child in self.children:
+            h.update(b'\0' + child.encode('utf-8') + b'\0')
+            try:
+                with open(child, 'rb') as f:
+                    h.update(hashlib.sha1(f.read()).digest())
+            except OSError:
+                h.update(b'missing')
+        return h.hexdigest()
 
     def merge(self, table):
         if not self.children:
             return
-        content.Merger(self.doc, self.root, self.children, table).merge()
+        _merge(self.root, self.children, self.title, table)
 
 
 class Nodes(object):
@@ -64,13 +89,17 @@ class Nodes(object):
     DIRECTIVE_RE = re.compile(
         r'^\s*(%s+?)?\s*(.+)?\s*$' % DIRECTIVE_PREFIX)
 
-    def __init__(self, rsrcs, rfile, tocfile):
+    def __init__(self, rsrcs, rfile, tocfile, skip=None):
         self.rsrcs = rsrcs
         self.rfile = rfile
         self.tocfile = tocfile
+        self.skip = skip or set()  # rsrcs to skip (duplicates)
         self.cache = set()  # title cache
         self.nodes = self.parse()
 
+    def _is_skipped(self, rsrc):
+        return bool(self.skip) and location.Location(rsrc).rsrc in self.skip
+
     def _create_toc_url(self, title):
         num = 0
         while True:
@@ -107,6 +136,7 @@ class Nodes(object):
         nodes = []
         level = 0
         queue = []
+        skipped = False  # some children in the queue are skipped
         # adding one extra ('# aaa') to handle the last node
         for rsrc in self.rsrcs + ['# aaa']:
             if rsrc.startswith(self.COMMENT):
@@ -121,14 +151,20 @@ class Nodes(object):
                 first = True
                 level = cnt
             else:
+                if self._is_skipped(rsrc):
+                    if level:
+                        skipped = True
+                    continue
                 if level == 0:
                     first = True
 
             if first and queue:
                 root, title_ = queue[0]
                 children = [q[0] for q in queue[1:]]
-                nodes.append(Node(root, children, title_))
+                if children or not skipped:  # not all children skipped
+                    nodes.append(Node(root, children, title_))
                 queue = []
+                skipped = False
 
             queue.append((rsrc, title))
 
@@ -140,10 +176,46 @@ class Nodes(object):
             t.append((node.root, node.children))
         return tuple(t)
 
-    def merge(self):
+    def _merge_nodes(self, nodes, table, workers):
+        workers = min(workers, len(nodes))
+        if workers <= 1:
+            for node in nodes:
+                node.merge(table)
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_merge,
+                node.root, node.children, node.title, table)
+                for node in nodes]
+            for future in futures:
+                future.result()
+
+    def merge(self, manifest=None, workers=1, force=False):
+        """Merge nodes, and write tocfile.
+
+        manifest: ``system.Manifest``, to skip nodes not changed
+        workers: number of processes to merge nodes
+        force: merge all nodes (but record to manifest)
+        """
         table = self.create_table()
+        nodes, keys = [], []
         for node in self.nodes:
-            node.merge(table)
+            if not node.children:
+                continue
+            key = node.get_key(table) if manifest else None
+            if not force and manifest and manifest.check(node.root, key):
+                continue
+            nodes.append(node)
+            keys.append(key)
+
+        logger.info('[toc] merge %d of %d nodes', len(nodes),
+            len([node for node in self.nodes if node.children]))
+        self._merge_nodes(nodes, table, workers)
+
+        if manifest and nodes:
+            for node, key in zip(nodes, keys):
+                manifest.record(node.root, key)
+            manifest.save()
 
         rfile = '%s %s\n' % (self.COMMENT, os.path.abspath(self.rfile))
         rsrcs = '\n'.join([node.rsrc for node in self.nodes])
@@ -161,5 +233,13 @@ def run(conf):
         raise ValueError(msg)
     tocfile = get_tocfile(rfile)
 
-    nodes = Nodes(rsrcs=rsrcs, rfile=rfile, tocfile=tocfile)
-    nodes.merge()
+    prefix = conf.general.download_dir
+    manifest = system.Manifest(os.path.join(prefix, MANIFEST))
+    force = conf.general.force_toc
+
+    skip = None
+    if conf.general.dedup:
+        skip = dedup.Deduplicator().get_duplicates(conf.sites)
+
+    nodes = Nodes(rsrcs=rsrcs, rfile=rfile, tocfile=tocfile, skip=skip)
+    nodes.merge(manifest=manifest, workers=conf.general.workers, force=force)
@@ -97,6 +97,8 @@ def _get_relative_reference(path, basepath, url):
 class URL(object):
     """Unroot URLs."""
 
+    __slots__ = ('_url', 'url')
+
     MATCHER = re.compile('^https?://', flags=re.IGNORECASE)
 
     def __init__(self, url):
@@ -122,6 +124,8 @@ class URL(object):
 class FileURL(object):
     """Unroot file URLs."""
 
+    __slots__ = ('_url', 'url')
+
     # Only for local files (no domain names or UNC).
     MATCHER = re.compile(
         '^file:/(/(localhost)?/)?(?=[^/])', flags=re.IGNORECASE)
@@ -154,6 +158,8 @@ class FileURL(object):
 class Path(object):
     """Unroot paths."""
 
+    __slots__ = ('_path',)
+
     ROOTPATH = re.compile('^/(/*)(?=[^/]*)')
 
     def __init__(self, path):
@@ -184,13 +190,20 @@ class Map(object):
     """Unroot and map URL and system path.
 
     'map' here means to change somewhat neutral paths to actual filepaths.
+
+    ``rsrc`` and the unrooted name are computed only once
+    (there may be a very large number of instances, accessed repeatedly).
     """
 
+    __slots__ = ('_rsrc', 'sep', '_cls', '_hashed', '_path', '_name')
+
     def __init__(self, rsrc, input_type=None):
         self._rsrc = rsrc
         self.sep = '/'
         self._cls = self._detect(rsrc, input_type)
         self._hashed = False
+        self._path = None  # cache for rsrc
+        self._name = None  # cache for unrooted (and maybe hashed) name
 
     def _detect(self, rsrc, input_type):
         if input_type:
@@ -210,7 +223,7 @@ class Map(object):
             return FileURL(rsrc)
         return Path(rsrc)
 
-    def _map_name(self, name):
+    def _hash_name(self, name):
         # 'name' is always derived from a URL, so it is ascii.
         for segment in name.split(self.sep):
             if len(segment) > 255:
@@ -219,6 +232,9 @@ class Map(object):
 
         return name
 
+    def _map_name(self, name):
+        return name
+
     @property
     def is_remote(self):
         return isinstance(self._cls, URL)
@@ -234,16 +250,19 @@ class Map(object):
 
     @property
     def rsrc(self):
-        if self.is_local:
-            # Note: FileURL returns system path.
-            return self._cls.path
-        else:
-            return self._cls.url
+        if self._path is None:
+            if self.is_local:
+                # Note: FileURL returns system path.
+                self._path = self._cls.path
+            else:
+                self._path = self._cls.url
+        return self._path
 
     @property
     def mapped_name(self):
-        name = self._cls.unroot()
-        return self._map_name(name)
+        if self._name is None:
+            self._name = self._hash_name(self._cls.unroot())
+        return self._map_name(self._name)
 
     @property
     def dfile(self):
@@ -268,6 +287,8 @@ class Ref(object):
     it creates '../foo.com/aaa.html'.
     """
 
+    __slots__ = ('_parent_cls', '_url', 'baseurl', '_cls', 'url', 'dfile')
+
     _CLS = Map
     _INHERIT = ()
 
@@ -0,0 +1,85 @@
+
+"""Split large conversions to volumes.
+
+Converters lay out the whole document in memory,
+so converting thousands of htmls at once can exhaust memory.
+Here, we estimate the cost (memory) of each html,
+and split htmls to contiguous volumes under a budget.
+
+The estimate is rough, from html bytes, element counts and image pixels.
+"""
+
+import logging
+import os
+
+from tosixinch import content
+from tosixinch import imagesize
+from tosixinch import lxml_html
+
+logger = logging.getLogger(__name__)
+
+# Approximate memory (bytes) converters use, per unit.
+BYTE_COST = 16  # html text (text boxes, glyphs)
+ELEMENT_COST = 4096  # element (style and layout boxes)
+PIXEL_COST = 4  # image pixel (decoded RGBA)
+
+
+def estimate_cost(fname, codings=None):
+    """Return estimated memory to convert a html."""
+    doc = lxml_html.read(fname, codings=codings, cache='share')
+    size = os.path.getsize(fname)
+    elements = sum(1 for _ in doc.iter())
+
+    images = [path for tag, path in content.iter_local_components(doc, fname)
+        if tag == 'img']
+    pixels = 0
+    for ret in imagesize.get_sizes(images).values():
+        if ret:
+            _, width, height = ret
+            pixels += int(width * height)
+
+    return size * BYTE_COST + elements * ELEMENT_COST + pixels * PIXEL_COST
+
+
+def _get_units(files, chapters):
+    """Group contiguous files of the same chapter (not ``None``)."""
+    units = []
+    prev = None
+    for fname, chapter in zip(files, chapters or [None] * len(files)):
+        if chapter is None or chapter != prev:
+            units.append([])
+        units[-1].append(fname)
+        prev = chapter
+    return units
+
+
+def split(files, budget, codings=None, chapters=None):
+    """Split files to contiguous volumes, the cost of each under budget.
+
+    chapters: toc chapter numbers (or ``None``) of files.
+    Volumes are split only between chapters,
+    unless a chapter is over budget by itself.
+    A file over budget makes a volume by itself.
+    """
+    volumes = [[]]
+    total = 0
+    for unit in _get_units(files, chapters):
+        costs = [(fname, estimate_cost(fname, codings)) for fname in unit]
+        if sum(cost for _, cost in costs) > budget:
+            parts = [[item] for item in costs]
+        else:
+            parts = [costs]
+
+        for part in parts:
+            cost = sum(cost for _, cost in part)
+            if volumes[-1] and total + cost > budget:
+                volumes.append([])
+                total = 0
+            volumes[-1].extend(fname for fname, _ in part)
+            total += cost
+            if cost > budget:
+                logger.warning('[volume] %r is over budget (%d MiB)',
+                    part[0][0], cost // 2 ** 20)
+
+    logger.debug('[volume] %d files to %d volumes', len(files), len(volumes))
+    return volumes